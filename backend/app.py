@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import os
 from pathlib import Path
 from typing import Any
 
@@ -9,11 +10,13 @@ from celery import Celery
 from celery.schedules import crontab
 from flask import Flask, jsonify, send_from_directory
 
+from . import cli, http_cache, lot_events, metrics, profiling
 from .extensions import cache, login_manager
-from .models import initialize_database
+from .models import db, initialize_database, migrations
 from .routes import admin, auth, user
 
 FRONTEND_DIR = Path(__file__).resolve().parent.parent / "frontend"
+EXPORT_DIR = Path(__file__).resolve().parent / "exports"
 
 
 def create_app() -> Flask:
@@ -24,20 +27,52 @@ def create_app() -> Flask:
     )
     app.config.update(
         SECRET_KEY="dev-key",
-        CACHE_TYPE="RedisCache",
+        CACHE_TYPE="backend.cache_backends.TwoTierCache",
+        # "memory" swaps Redis for a process-local store (tests, tooling).
+        CACHE_MODE=os.environ.get("PARKING_CACHE_MODE", "redis"),
+        CACHE_L1_MAX_ENTRIES=1024,
+        CACHE_L1_TTL=5,
         CACHE_REDIS_HOST="localhost",
         CACHE_REDIS_PORT=6379,
         CACHE_DEFAULT_TIMEOUT=300,
         REDIS_URL="redis://localhost:6379/0",
         CELERY_BROKER_URL="redis://localhost:6379/1",
         CELERY_RESULT_BACKEND="redis://localhost:6379/2",
+        # Anchored to the package, not the working directory, so web and
+        # worker processes agree on it (and on the X-Accel-Redirect alias).
+        EXPORT_DIR=str(EXPORT_DIR),
+        # Write a .gz sibling next to plain CSV exports for gzip clients.
+        EXPORT_PRECOMPRESS=True,
+        # Hand export bytes to the front proxy: USE_X_SENDFILE (Apache,
+        # lighttpd) or an nginx internal location for X-Accel-Redirect.
+        USE_X_SENDFILE=False,
+        EXPORT_ACCEL_REDIRECT_PREFIX=None,
+        RESERVATIONS_PAGE_SIZE=50,
+        # Closed reservations older than this move to reservations_archive.
+        ARCHIVE_AFTER_DAYS=365,
+        ARCHIVE_BATCH_SIZE=1000,
+        ARCHIVE_VACUUM=True,
+        # Install the cProfile hooks; with the default sample rates of 0
+        # only admin requests sending an X-Profile header are profiled.
+        PROFILE_ENABLED=os.environ.get("PARKING_PROFILING") == "1",
     )
     app.config.setdefault("CACHE_REDIS_URL", app.config["REDIS_URL"])
 
     cache.init_app(app)
     login_manager.init_app(app)
+    db.init_app(app)
+    metrics.init_app(app)
+    profiling.init_app(app)
+    lot_events.init_app(app)
+    http_cache.init_app(app)
 
     initialize_database()
+    if app.config["DB_AUTO_MIGRATE"]:
+        try:
+            migrations.apply_migrations()
+        finally:
+            db.close_connection()
+    cli.register(app)
 
     app.register_blueprint(auth.bp)
     app.register_blueprint(admin.bp)
@@ -69,7 +104,10 @@ def make_celery(flask_app: Flask) -> Celery:
         broker=flask_app.config["CELERY_BROKER_URL"],
         backend=flask_app.config["CELERY_RESULT_BACKEND"],
     )
-    celery.conf.update(flask_app.config)
+    # Broker and backend are passed above; copying the old-style keys too
+    # would mix setting formats, which Celery rejects on first use.
+    explicit = ("CELERY_BROKER_URL", "CELERY_RESULT_BACKEND")
+    celery.conf.update({key: value for key, value in flask_app.config.items() if key not in explicit})
 
     class ContextTask(celery.Task):
         def __call__(self, *args: Any, **kwargs: Any) -> Any:  # type: ignore[override]
@@ -86,6 +124,22 @@ def make_celery(flask_app: Flask) -> Celery:
             "task": "backend.tasks.send_monthly_reports",
             "schedule": crontab(day_of_month="1", hour=18, minute=10),
         },
+        "wal-checkpoint": {
+            "task": "backend.tasks.checkpoint_database",
+            "schedule": crontab(minute="*/15"),
+        },
+        "reconcile-lot-counters": {
+            "task": "backend.tasks.reconcile_lot_counters",
+            "schedule": crontab(minute=30),
+        },
+        "usage-rollups": {
+            "task": "backend.tasks.refresh_usage_rollups",
+            "schedule": crontab(minute="*/10"),
+        },
+        "archive-reservations": {
+            "task": "backend.tasks.archive_reservations",
+            "schedule": crontab(hour=3, minute=30),
+        },
     }
     celery.conf.timezone = "UTC"
     return celery
@@ -0,0 +1,270 @@
+"""Two-tier cache backend: per-worker LRU in front of Redis or memory."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from flask_caching.backends.base import BaseCache
+from flask_caching.backends.rediscache import RedisCache
+from flask_caching.backends.simplecache import SimpleCache
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe LRU bounded by entry count and a per-entry TTL."""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 5.0) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return _MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class TwoTierCache(BaseCache):
+    """Serve reads from a worker-local LRU (L1) before the shared cache (L2).
+
+    Deletes, increments and clears are broadcast over Redis pub/sub so every
+    worker drops its L1 copy together. In ``memory`` mode L2 is a
+    process-local SimpleCache and no broadcast is needed, which lets the app
+    and its tools run without Redis.
+    """
+
+    def __init__(
+        self,
+        remote: BaseCache,
+        *,
+        l1_max_entries: int = 1024,
+        l1_ttl: float = 5.0,
+        channel: str = "cache:invalidate",
+        redis_client: Any = None,
+        default_timeout: int = 300,
+    ) -> None:
+        super().__init__(default_timeout=default_timeout)
+        self.remote = remote
+        self.l1 = LRUCache(l1_max_entries, l1_ttl)
+        self.channel = channel
+        self.ignore_errors = True
+        self._redis = redis_client
+        self._sender = uuid.uuid4().hex
+        self._listener: Optional[threading.Thread] = None
+        self._listener_pid: Optional[int] = None
+        self._listener_lock = threading.Lock()
+        self.remote_hits = 0
+        self.remote_misses = 0
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        mode = config.get("CACHE_MODE", "redis")
+        options = {
+            "l1_max_entries": int(config.get("CACHE_L1_MAX_ENTRIES", 1024)),
+            "l1_ttl": float(config.get("CACHE_L1_TTL", 5)),
+            "channel": config.get("CACHE_INVALIDATION_CHANNEL", "cache:invalidate"),
+            "default_timeout": kwargs.get("default_timeout", 300),
+        }
+        if mode == "memory":
+            remote = SimpleCache.factory(app, config, [], dict(kwargs))
+            return cls(remote, **options)
+        if mode != "redis":
+            raise ValueError(f"unknown CACHE_MODE: {mode}")
+        remote = RedisCache.factory(app, config, [], dict(kwargs))
+        return cls(remote, redis_client=remote._write_client, **options)
+
+    @property
+    def redis_client(self) -> Any:
+        # Shared with other pub/sub users (lot events); None in memory mode.
+        return self._redis
+
+    # Invalidation fan-out -------------------------------------------------
+
+    def _ensure_listener(self) -> None:
+        if self._redis is None:
+            return
+        pid = os.getpid()
+        if self._listener is not None and self._listener.is_alive() and self._listener_pid == pid:
+            return
+        with self._listener_lock:
+            if self._listener is not None and self._listener.is_alive() and self._listener_pid == pid:
+                return
+            self._listener = threading.Thread(target=self._listen, name="cache-invalidation", daemon=True)
+            self._listener_pid = pid
+            self._listener.start()
+
+    def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # Anything cached while we were disconnected may be stale.
+                self.l1.clear()
+                for message in pubsub.listen():
+                    self._on_message(message.get("data"))
+            except Exception:  # noqa: BLE001 - keep the listener alive
+                logger.warning("cache invalidation listener disconnected", exc_info=True)
+                time.sleep(1)
+
+    def _on_message(self, data: Any) -> None:
+        try:
+            payload = json.loads(data)
+        except (TypeError, ValueError):
+            return
+        if payload.get("sender") == self._sender:
+            return
+        if payload.get("clear"):
+            self.l1.clear()
+            return
+        for key in payload.get("keys", []):
+            self.l1.delete(key)
+
+    def _broadcast(self, keys: Iterable[str] = (), clear: bool = False) -> None:
+        if self._redis is None:
+            return
+        payload = json.dumps({"sender": self._sender, "keys": list(keys), "clear": clear})
+        try:
+            self._redis.publish(self.channel, payload)
+        except Exception:  # noqa: BLE001 - L1 TTL still bounds staleness
+            logger.warning("cache invalidation broadcast failed", exc_info=True)
+
+    # Cache API -------------------------------------------------------------
+
+    def _l1_ttl(self, timeout: Optional[int]) -> float:
+        timeout = self._normalize_timeout(timeout)
+        return self.l1.ttl if timeout == 0 else timeout
+
+    def get(self, key: str) -> Any:
+        self._ensure_listener()
+        value = self.l1.get(key)
+        if value is not _MISSING:
+            return value
+        value = self.remote.get(key)
+        if value is None:
+            self.remote_misses += 1
+            return None
+        self.remote_hits += 1
+        self.l1.set(key, value)
+        return value
+
+    def get_many(self, *keys: str) -> List[Any]:
+        self._ensure_listener()
+        values = [self.l1.get(key) for key in keys]
+        missing = [key for key, value in zip(keys, values) if value is _MISSING]
+        if missing:
+            fetched = dict(zip(missing, self.remote.get_many(*missing)))
+            for key, value in fetched.items():
+                if value is None:
+                    self.remote_misses += 1
+                else:
+                    self.remote_hits += 1
+                    self.l1.set(key, value)
+            values = [fetched.get(key) if value is _MISSING else value for key, value in zip(keys, values)]
+        return values
+
+    def set(self, key: str, value: Any, timeout: Optional[int] = None) -> Any:
+        result = self.remote.set(key, value, timeout=timeout)
+        self.l1.set(key, value, self._l1_ttl(timeout))
+        return result
+
+    def set_many(self, mapping: Dict[str, Any], timeout: Optional[int] = None) -> List[Any]:
+        result = self.remote.set_many(mapping, timeout=timeout)
+        for key, value in mapping.items():
+            self.l1.set(key, value, self._l1_ttl(timeout))
+        return result
+
+    def add(self, key: str, value: Any, timeout: Optional[int] = None) -> bool:
+        # Used for locks: always decided by the shared tier.
+        self.l1.delete(key)
+        return self.remote.add(key, value, timeout=timeout)
+
+    def has(self, key: str) -> bool:
+        return self.l1.get(key) is not _MISSING or self.remote.has(key)
+
+    def delete(self, key: str) -> bool:
+        self.l1.delete(key)
+        result = self.remote.delete(key)
+        self._broadcast([key])
+        return result
+
+    def delete_many(self, *keys: str) -> List[Any]:
+        for key in keys:
+            self.l1.delete(key)
+        result = self.remote.delete_many(*keys)
+        self._broadcast(keys)
+        return result
+
+    def inc(self, key: str, delta: int = 1) -> Optional[int]:
+        self.l1.delete(key)
+        result = self.remote.inc(key, delta=delta)
+        self._broadcast([key])
+        return result
+
+    def dec(self, key: str, delta: int = 1) -> Optional[int]:
+        self.l1.delete(key)
+        result = self.remote.dec(key, delta=delta)
+        self._broadcast([key])
+        return result
+
+    def clear(self) -> bool:
+        self.l1.clear()
+        result = self.remote.clear()
+        self._broadcast(clear=True)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": "redis" if self._redis is not None else "memory",
+            "l1": self.l1.stats(),
+            "l2": {"hits": self.remote_hits, "misses": self.remote_misses},
+        }
@@ -3,3 +3,33 @@
 ADMIN_LOTS_CACHE_KEY = "admin:lots"
 ADMIN_DASHBOARD_CACHE_KEY = "admin:dashboard"
 USER_LOTS_CACHE_KEY = "user:lots"
+
+# Per-lot entries plus the lot id index they are assembled from.
+LOT_CACHE_KEY = "lot:{lot_id}"
+LOT_INDEX_CACHE_KEY = "lots:index"
+# Bumped on every lot write; list keys above are suffixed with it.
+LOTS_GENERATION_KEY = "lots:generation"
+
+AUTH_USER_CACHE_KEY = "auth:user:{user_id}"
+
+# Opaque data versions behind HTTP ETags; deleted to bump, reseeded on read.
+# Lot listings are tagged with LOTS_GENERATION_KEY instead.
+RESERVATIONS_VERSION_KEY = "version:reservations:{user_id}"
+# Covers every user's reservations (archival moves rows for many users).
+RESERVATIONS_EPOCH_KEY = "version:reservations"
+
+
+def lot_key(lot_id: int) -> str:
+    return LOT_CACHE_KEY.format(lot_id=lot_id)
+
+
+def auth_user_key(user_id: int) -> str:
+    return AUTH_USER_CACHE_KEY.format(user_id=user_id)
+
+
+def versioned(key: str, generation: int) -> str:
+    return f"{key}:v{generation}"
+
+
+def reservations_version_key(user_id: int) -> str:
+    return RESERVATIONS_VERSION_KEY.format(user_id=user_id)
@@ -0,0 +1,119 @@
+"""Stampede-safe get-or-compute helper on top of the shared cache."""
+
+from __future__ import annotations
+
+import math
+import random
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+from .extensions import cache
+
+LOCK_TIMEOUT = 10
+WAIT_INTERVAL = 0.05
+
+# Striped so versioned keys do not grow an unbounded lock table.
+_local_locks = [threading.Lock() for _ in range(64)]
+
+
+def _local_lock(key: str) -> threading.Lock:
+    return _local_locks[hash(key) % len(_local_locks)]
+
+
+class _SingleFlight:
+    """Per-key lock held in-process first, then across workers via cache.add."""
+
+    def __init__(self, key: str, timeout: int) -> None:
+        self.lock_key = f"lock:{key}"
+        self.timeout = timeout
+        self.token = uuid.uuid4().hex
+        self._local = _local_lock(key)
+        self.acquired = False
+
+    def try_acquire(self) -> bool:
+        if not self._local.acquire(blocking=False):
+            return False
+        # add() is SETNX on Redis, so only one worker wins.
+        if not cache.add(self.lock_key, self.token, timeout=self.timeout):
+            self._local.release()
+            return False
+        self.acquired = True
+        return True
+
+    def release(self) -> None:
+        if not self.acquired:
+            return
+        if cache.get(self.lock_key) == self.token:
+            cache.delete(self.lock_key)
+        self._local.release()
+        self.acquired = False
+
+
+def _envelope(value: Any, ttl: int, delta: float) -> Dict[str, Any]:
+    return {"value": value, "expires": time.time() + ttl, "delta": delta}
+
+
+def _is_fresh(envelope: Dict[str, Any], beta: float) -> bool:
+    # XFetch: refresh early with a probability that rises as expiry nears
+    # and with how long the value takes to compute.
+    jitter = -envelope["delta"] * beta * math.log(random.random() or 1e-12)
+    return time.time() + jitter < envelope["expires"]
+
+
+def _store(key: str, value: Any, ttl: int, stale_ttl: int, delta: float, fallback_key: Optional[str]) -> None:
+    envelope = _envelope(value, ttl, delta)
+    cache.set(key, envelope, timeout=ttl + stale_ttl)
+    if fallback_key is not None:
+        cache.set(fallback_key, envelope, timeout=ttl + stale_ttl)
+
+
+def get_or_compute(
+    key: str,
+    compute: Callable[[], Any],
+    ttl: int,
+    *,
+    stale_ttl: int = 60,
+    beta: float = 1.0,
+    fallback_key: Optional[str] = None,
+    lock_timeout: int = LOCK_TIMEOUT,
+) -> Any:
+    """Return the cached value for ``key``, recomputing it at most once at a time.
+
+    Values stay readable for ``stale_ttl`` seconds past ``ttl``; while one
+    caller recomputes, the others are served that stale copy (or the copy
+    under ``fallback_key``, e.g. the previous generation of a versioned
+    key) instead of piling onto the database.
+    """
+    envelope = cache.get(key)
+    if envelope is not None and _is_fresh(envelope, beta):
+        return envelope["value"]
+    stale = envelope
+    if stale is None and fallback_key is not None:
+        stale = cache.get(fallback_key)
+
+    flight = _SingleFlight(key, lock_timeout)
+    deadline = time.monotonic() + lock_timeout
+    while not flight.try_acquire():
+        if stale is not None:
+            return stale["value"]
+        if time.monotonic() >= deadline:
+            # The lock holder is stuck; compute without it.
+            break
+        time.sleep(WAIT_INTERVAL)
+        envelope = cache.get(key)
+        if envelope is not None:
+            return envelope["value"]
+    try:
+        envelope = cache.get(key)
+        refreshed = envelope is not None and (stale is None or envelope["expires"] != stale["expires"])
+        if refreshed and envelope["expires"] > time.time():
+            # Another caller refreshed it while we waited for the lock.
+            return envelope["value"]
+        started = time.perf_counter()
+        value = compute()
+        _store(key, value, ttl, stale_ttl, time.perf_counter() - started, fallback_key)
+        return value
+    finally:
+        flight.release()
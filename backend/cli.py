@@ -0,0 +1,83 @@
+"""Flask CLI commands for database maintenance."""
+
+from __future__ import annotations
+
+import json
+
+import click
+from flask import Flask
+
+from . import http_cache, query_plans
+from .models import archive, db, migrations, rollups
+
+
+@click.command("db-settings")
+def db_settings_command() -> None:
+    # Print the configured and effective SQLite settings.
+    click.echo(json.dumps(db.effective_pragmas(), indent=2))
+
+
+@click.command("db-checkpoint")
+@click.option("--mode", default=None, help="PASSIVE, FULL, RESTART or TRUNCATE")
+def db_checkpoint_command(mode: str | None) -> None:
+    # Run a WAL checkpoint immediately.
+    from flask import current_app
+
+    result = db.checkpoint(mode or current_app.config["SQLITE_CHECKPOINT_MODE"])
+    click.echo(json.dumps(result))
+
+
+@click.command("db-migrate")
+@click.option("--target", type=int, default=None, help="Stop after this schema version.")
+@click.option("--status", is_flag=True, help="Only report applied and pending migrations.")
+def db_migrate_command(target: int | None, status: bool) -> None:
+    # Apply pending schema migrations.
+    if status:
+        for row in migrations.applied_migrations():
+            click.echo(f"applied  {row['version']:>4}  {row['description']}")
+        for migration in migrations.pending_migrations():
+            click.echo(f"pending  {migration.version:>4}  {migration.description}")
+        return
+    applied = migrations.apply_migrations(target)
+    click.echo(f"applied {applied or 'nothing'}; schema version {migrations.current_version()}")
+
+
+@click.command("db-archive")
+@click.option("--days", type=int, default=None, help="Archive reservations closed more than this many days ago.")
+@click.option("--batch-size", type=int, default=None)
+@click.option("--vacuum/--no-vacuum", default=None, help="Run VACUUM after moving rows.")
+def db_archive_command(days: int | None, batch_size: int | None, vacuum: bool | None) -> None:
+    # Move old closed reservations to the archive table right away.
+    from flask import current_app
+
+    config = current_app.config
+    rollups.refresh()
+    moved = archive.archive_closed(
+        config["ARCHIVE_AFTER_DAYS"] if days is None else days,
+        batch_size or config["ARCHIVE_BATCH_SIZE"],
+    )
+    if moved:
+        http_cache.bump_reservations()
+        archive.compact(vacuum=config["ARCHIVE_VACUUM"] if vacuum is None else vacuum)
+    click.echo(json.dumps({"moved": moved, **archive.archive_stats()}))
+
+
+@click.command("db-plans")
+@click.option("--query", "names", multiple=True, help="Only check this registered query (repeatable).")
+def db_plans_command(names: tuple[str, ...]) -> None:
+    # Explain the registered read queries; exits 1 if one scans a large table.
+    report = query_plans.check_plans(names=names or None)
+    for result in report["queries"]:
+        click.echo(f"{'ok  ' if result['ok'] else 'FAIL'} {result['ms']:>9.2f} ms  {result['name']}")
+        for problem in result["problems"]:
+            click.echo(f"       {problem}")
+    if not report["ok"]:
+        raise SystemExit(1)
+
+
+def register(app: Flask) -> None:
+    app.cli.add_command(db_settings_command)
+    app.cli.add_command(db_checkpoint_command)
+    app.cli.add_command(db_migrate_command)
+    app.cli.add_command(db_archive_command)
+    app.cli.add_command(db_plans_command)
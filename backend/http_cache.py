@@ -0,0 +1,94 @@
+"""Conditional GETs: ETags from cheap data versions, 304s and Cache-Control."""
+
+from __future__ import annotations
+
+import hashlib
+import secrets
+import time
+from typing import Any, Callable, Optional, Tuple
+
+from flask import Flask, Response, current_app, request
+
+from . import cache_keys, lot_cache
+from .extensions import cache
+
+
+def _token() -> str:
+    return f"{time.time_ns():x}{secrets.token_hex(2)}"
+
+
+def _version(key: str) -> str:
+    # Versions are opaque tokens rather than counters: an evicted counter
+    # restarts and could repeat a value a client still holds as its ETag.
+    value = cache.get(key)
+    if value is None:
+        value = _token()
+        if not cache.add(key, value, timeout=0):
+            # Another worker seeded it first.
+            value = cache.get(key) or value
+    return str(value)
+
+
+def bump(key: str) -> None:
+    # Deletes fan out to every worker's L1, unlike plain sets.
+    cache.delete(key)
+
+
+def bump_reservations(user_id: Optional[int] = None) -> None:
+    # One user's bookings changed, or (no user) rows moved for many users.
+    bump(cache_keys.reservations_version_key(user_id) if user_id is not None else cache_keys.RESERVATIONS_EPOCH_KEY)
+
+
+def reservations_tag(user_id: int) -> str:
+    # Listings also show lot names, and the query string picks the page.
+    parts = (
+        _version(cache_keys.reservations_version_key(user_id)),
+        _version(cache_keys.RESERVATIONS_EPOCH_KEY),
+        str(lot_cache.generation()),
+        request.query_string.decode("latin-1"),
+    )
+    digest = hashlib.sha1("|".join(parts).encode()).hexdigest()[:20]
+    return f"reservations-{user_id}-{digest}"
+
+
+def _tagged(response: Response, tag: str) -> Response:
+    response.set_etag(tag, weak=True)
+    response.cache_control.private = True
+    max_age = int(current_app.config["HTTP_LIST_MAX_AGE"])
+    if max_age:
+        response.cache_control.max_age = max_age
+    else:
+        # Revalidate every time; the ETag makes that a cheap 304.
+        response.cache_control.no_cache = True
+    return response
+
+
+def conditional(tag: str, build: Callable[[], Any]) -> Response:
+    # Answer 304 when the client already holds ``tag``; only otherwise call
+    # ``build``, so an unchanged poll touches neither the cache entries
+    # behind the body nor the database. ``tag`` must be read before the
+    # data, so a body is never tagged newer than it is.
+    if request.if_none_match.contains_weak(tag):
+        return _tagged(current_app.response_class(status=304), tag)
+    response = current_app.make_response(build())
+    if response.status_code != 200:
+        return response
+    return _tagged(response, tag)
+
+
+def lot_listing(prefix: str, view: Callable[[], Tuple[int, Any]], key: Optional[str] = None) -> Response:
+    # Like conditional() for the generation-versioned lot_cache views. The
+    # body is tagged with the generation it was built for: while another
+    # request rebuilds, the previous generation is served and must not go
+    # out under the current tag.
+    current = f"{prefix}-{lot_cache.generation()}"
+    if request.if_none_match.contains_weak(current):
+        return _tagged(current_app.response_class(status=304), current)
+    served, value = view()
+    response = current_app.make_response({key: value} if key else value)
+    return _tagged(response, f"{prefix}-{served}")
+
+
+def init_app(app: Flask) -> None:
+    # Seconds browsers may reuse a listing before revalidating (0: always).
+    app.config.setdefault("HTTP_LIST_MAX_AGE", 0)
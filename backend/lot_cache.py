@@ -0,0 +1,119 @@
+"""Per-lot cache entries and generation-versioned lot listings."""
+
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, List, Tuple
+
+from . import cache_keys
+from .caching import get_or_compute
+from .extensions import cache
+from .models import lots
+
+LOT_TIMEOUT = 300
+USER_LIST_TIMEOUT = 120
+ADMIN_LIST_TIMEOUT = 300
+_PUBLIC_FIELDS = ("id", "name", "price_per_hour", "address", "pin_code", "total_spots", "available_spots")
+_ADMIN_FIELDS = _PUBLIC_FIELDS + ("created_at",)
+
+
+def generation() -> int:
+    value = cache.get(cache_keys.LOTS_GENERATION_KEY)
+    if value is None:
+        # Seed through inc(): Redis INCR rejects pickled values written by set().
+        # Flask-Caching does not proxy inc(); the backend's is atomic on Redis.
+        # Seeding from the clock keeps an evicted counter from restarting at
+        # a generation (and HTTP ETag) that was already handed out.
+        value = cache.cache.inc(cache_keys.LOTS_GENERATION_KEY, time.time_ns() // 1000)
+    return int(value or 0)
+
+
+def invalidate(*lot_ids: int, membership: bool = False) -> None:
+    # Drop only the touched lots, then bump the generation so every list
+    # view is reassembled from the remaining per-lot entries.
+    keys = [cache_keys.lot_key(lot_id) for lot_id in lot_ids]
+    if membership:
+        keys.append(cache_keys.LOT_INDEX_CACHE_KEY)
+    # delete_many() stops at the first missing key on some backends.
+    for key in keys:
+        cache.delete(key)
+    # inc() would restart a missing counter at 1, so seed it first.
+    generation()
+    cache.cache.inc(cache_keys.LOTS_GENERATION_KEY)
+
+
+def _lot_ids() -> List[int]:
+    ids = cache.get(cache_keys.LOT_INDEX_CACHE_KEY)
+    if ids is None:
+        ids = lots.list_lot_ids()
+        cache.set(cache_keys.LOT_INDEX_CACHE_KEY, ids, timeout=LOT_TIMEOUT)
+    return ids
+
+
+def lot_entries() -> List[Dict[str, Any]]:
+    # Assemble all lots, loading only the entries missing from the cache.
+    started_at = generation()
+    ids = _lot_ids()
+    cached = cache.get_many(*[cache_keys.lot_key(lot_id) for lot_id in ids]) if ids else []
+    entries = dict(zip(ids, cached))
+    missing = [lot_id for lot_id, entry in entries.items() if entry is None]
+    if missing:
+        fresh = {int(lot["id"]): lot for lot in lots.get_lots(missing)}
+        entries.update(fresh)
+        # A write that landed while we were reading may have been missed.
+        if generation() == started_at:
+            cache.set_many(
+                {cache_keys.lot_key(lot_id): lot for lot_id, lot in fresh.items()},
+                timeout=LOT_TIMEOUT,
+            )
+    return [entries[lot_id] for lot_id in ids if entries.get(lot_id) is not None]
+
+
+def _project(entry: Dict[str, Any], fields: tuple[str, ...]) -> Dict[str, Any]:
+    return {field: entry.get(field) for field in fields}
+
+
+def _versioned_view(key: str, build, timeout: int) -> Tuple[int, Any]:
+    # The unversioned key keeps the last generation around so it can be
+    # served while a single caller rebuilds the current one. Values carry
+    # the generation they were built for, which is what callers get back.
+    current = generation()
+    return get_or_compute(
+        cache_keys.versioned(key, current),
+        lambda: (current, build()),
+        timeout,
+        fallback_key=key,
+    )
+
+
+def admin_lots() -> Tuple[int, List[Dict[str, Any]]]:
+    return _versioned_view(
+        cache_keys.ADMIN_LOTS_CACHE_KEY,
+        lambda: [_project(entry, _ADMIN_FIELDS) for entry in lot_entries()],
+        ADMIN_LIST_TIMEOUT,
+    )
+
+
+def user_lots() -> Tuple[int, List[Dict[str, Any]]]:
+    return _versioned_view(
+        cache_keys.USER_LOTS_CACHE_KEY,
+        lambda: [
+            _project(entry, _PUBLIC_FIELDS)
+            for entry in lot_entries()
+            if int(entry.get("available_spots") or 0) > 0
+        ],
+        USER_LIST_TIMEOUT,
+    )
+
+
+def _dashboard_from_entries() -> Dict[str, int]:
+    entries = lot_entries()
+    return {
+        "lots": len(entries),
+        "total_spots": sum(int(entry["available_spots"]) + int(entry["occupied_spots"]) for entry in entries),
+        "occupied": sum(int(entry["occupied_spots"]) for entry in entries),
+    }
+
+
+def dashboard_stats() -> Tuple[int, Dict[str, int]]:
+    return _versioned_view(cache_keys.ADMIN_DASHBOARD_CACHE_KEY, _dashboard_from_entries, ADMIN_LIST_TIMEOUT)
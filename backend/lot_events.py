@@ -0,0 +1,281 @@
+"""Lot availability change events fanned out to Server-Sent Event streams."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+from flask import Flask, current_app
+
+from .extensions import cache
+from .models import db, lots
+
+logger = logging.getLogger(__name__)
+
+Event = Tuple[int, Dict[str, Any]]
+_STATE_FIELDS = ("available_spots", "occupied_spots", "total_spots")
+
+
+class LocalBroker:
+    """Bounded in-process event log that stream threads wait on.
+
+    Entries carry a local position (arrival order, used to wait for new
+    events) and the event id clients resume from with Last-Event-ID.
+    """
+
+    def __init__(self, backlog: int = 1000) -> None:
+        self._cond = threading.Condition()
+        self._events: Deque[Tuple[int, int, Dict[str, Any]]] = deque(maxlen=backlog)
+        self._position = 0
+        self._last_id = 0
+
+    def _append(self, event_id: int, payload: Dict[str, Any]) -> None:
+        with self._cond:
+            self._position += 1
+            self._events.append((self._position, event_id, payload))
+            self._last_id = max(self._last_id, event_id)
+            self._cond.notify_all()
+
+    def publish(self, payload: Dict[str, Any]) -> int:
+        with self._cond:
+            event_id = self._last_id + 1
+            self._append(event_id, payload)
+        return event_id
+
+    def position(self) -> int:
+        with self._cond:
+            return self._position
+
+    def last_id(self) -> int:
+        with self._cond:
+            return self._last_id
+
+    def wait(self, position: int, timeout: float) -> Tuple[int, List[Event], bool]:
+        # Events that arrived after ``position``, waiting up to ``timeout``;
+        # the flag is set when some were trimmed before this reader got them.
+        with self._cond:
+            if self._position <= position:
+                self._cond.wait(timeout)
+            events = [(event_id, payload) for seen, event_id, payload in self._events if seen > position]
+            missed = bool(self._events) and self._events[0][0] > position + 1
+            return self._position, events, missed
+
+    def replay(self, after: int) -> Optional[List[Event]]:
+        # Events newer than ``after`` in id order, or None when some of them
+        # have already been trimmed (or ``after`` is from another epoch).
+        with self._cond:
+            if after > self._last_id:
+                return None
+            events = sorted((event_id, payload) for _, event_id, payload in self._events if event_id > after)
+            if after < self._last_id and (not events or events[0][0] != after + 1):
+                return None
+            return events
+
+
+class RedisBroker(LocalBroker):
+    """Fan events out through Redis pub/sub so every worker process sees them.
+
+    Ids come from a Redis counter and the last ``backlog`` events are kept in
+    a sorted set for Last-Event-ID replay. A listener thread per process
+    feeds the local log that stream threads wait on.
+    """
+
+    # How long a stream waits for the listener's SUBSCRIBE to be confirmed.
+    SUBSCRIBE_TIMEOUT = 5.0
+
+    def __init__(self, client: Any, channel: str, backlog: int = 1000) -> None:
+        super().__init__(backlog)
+        self.client = client
+        self.channel = channel
+        self.backlog = backlog
+        self.sequence_key = f"{channel}:seq"
+        self.backlog_key = f"{channel}:backlog"
+        self._listener: Optional[threading.Thread] = None
+        self._listener_pid: Optional[int] = None
+        self._listener_lock = threading.Lock()
+        self._subscribed = threading.Event()
+
+    def publish(self, payload: Dict[str, Any]) -> int:
+        event_id = int(self.client.incr(self.sequence_key))
+        message = json.dumps({"id": event_id, "data": payload})
+        pipe = self.client.pipeline()
+        pipe.zadd(self.backlog_key, {message: event_id})
+        pipe.zremrangebyrank(self.backlog_key, 0, -(self.backlog + 1))
+        pipe.publish(self.channel, message)
+        pipe.execute()
+        return event_id
+
+    def position(self) -> int:
+        # Streams take their position before reading last_id() and the
+        # snapshot, so the listener must already be subscribed by then or
+        # events published in between never reach the local log.
+        self._ensure_listener()
+        return super().position()
+
+    def last_id(self) -> int:
+        return int(self.client.get(self.sequence_key) or 0)
+
+    def wait(self, position: int, timeout: float) -> Tuple[int, List[Event], bool]:
+        self._ensure_listener()
+        return super().wait(position, timeout)
+
+    def replay(self, after: int) -> Optional[List[Event]]:
+        last = self.last_id()
+        if after > last:
+            return None
+        if after == last:
+            return []
+        rows = self.client.zrangebyscore(self.backlog_key, f"({after}", "+inf")
+        events = sorted((int(item["id"]), item["data"]) for item in map(json.loads, rows))
+        if not events or events[0][0] != after + 1:
+            return None
+        return events
+
+    def _ensure_listener(self) -> None:
+        pid = os.getpid()
+        if not (self._listener is not None and self._listener.is_alive() and self._listener_pid == pid):
+            with self._listener_lock:
+                if not (self._listener is not None and self._listener.is_alive() and self._listener_pid == pid):
+                    self._subscribed.clear()
+                    self._listener = threading.Thread(target=self._listen, name="lot-events", daemon=True)
+                    self._listener_pid = pid
+                    self._listener.start()
+        if not self._subscribed.wait(self.SUBSCRIBE_TIMEOUT):
+            logger.warning("lot event listener not subscribed after %.1fs", self.SUBSCRIBE_TIMEOUT)
+
+    def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = self.client.pubsub()
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    if message.get("type") == "subscribe":
+                        self._subscribed.set()
+                        continue
+                    if message.get("type") != "message":
+                        continue
+                    try:
+                        item = json.loads(message.get("data"))
+                    except (TypeError, ValueError):
+                        continue
+                    self._append(int(item["id"]), item["data"])
+            except Exception:  # noqa: BLE001 - keep the listener alive
+                self._subscribed.clear()
+                logger.warning("lot event listener disconnected", exc_info=True)
+                time.sleep(1)
+
+
+def broker() -> LocalBroker:
+    # One broker per app, created on first use once the cache (and with it
+    # the Redis client, if any) is configured.
+    app = current_app._get_current_object()  # type: ignore[attr-defined]
+    hub = app.extensions.get("lot_events")
+    if hub is None:
+        client = getattr(cache.cache, "redis_client", None)
+        backlog = int(app.config["LOT_EVENTS_BACKLOG"])
+        if client is not None:
+            hub = RedisBroker(client, app.config["LOT_EVENTS_CHANNEL"], backlog)
+        else:
+            hub = LocalBroker(backlog)
+        hub = app.extensions.setdefault("lot_events", hub)
+    return hub
+
+
+def _state(lot: Dict[str, Any]) -> Dict[str, Any]:
+    return {"lot_id": int(lot["id"]), **{field: int(lot[field] or 0) for field in _STATE_FIELDS}}
+
+
+def publish_lots(*lot_ids: int) -> None:
+    # Announce the current counters of lots whose availability changed;
+    # lots that no longer exist are announced as deleted. Called after the
+    # change committed, so a failure here never undoes it.
+    if not lot_ids or not current_app.config["LOT_EVENTS_ENABLED"]:
+        return
+    try:
+        found = {int(lot["id"]): lot for lot in lots.get_lots(lot_ids)}
+        hub = broker()
+        for lot_id in dict.fromkeys(int(lot_id) for lot_id in lot_ids):
+            lot = found.get(lot_id)
+            hub.publish(_state(lot) if lot is not None else {"lot_id": lot_id, "deleted": True})
+    except Exception:  # noqa: BLE001 - subscribers catch up from their next snapshot
+        logger.warning("could not publish lot events for %s", lot_ids, exc_info=True)
+
+
+def _format(event_id: int, event: str, payload: Dict[str, Any]) -> str:
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n"
+
+
+def stream(lot_ids: Optional[Set[int]], last_event_id: Optional[int]) -> Iterator[str]:
+    # Yield SSE frames: replay after ``last_event_id`` when the backlog still
+    # covers it, otherwise a snapshot of the subscribed lots; then live
+    # ``lot`` events, with a comment heartbeat while idle. Streams end after
+    # LOT_EVENTS_MAX_STREAM_SECONDS so worker threads recycle; EventSource
+    # reconnects on its own and resumes from the last id it saw.
+    config = current_app.config
+    hub = broker()
+    heartbeat = float(config["LOT_EVENTS_HEARTBEAT"])
+    deadline = time.monotonic() + float(config["LOT_EVENTS_MAX_STREAM_SECONDS"])
+
+    def wanted(payload: Dict[str, Any]) -> bool:
+        return lot_ids is None or int(payload["lot_id"]) in lot_ids
+
+    def snapshot() -> Tuple[int, str]:
+        # Read from the database, not the (possibly worker-local or stale)
+        # lot cache: events up to ``covered`` are skipped after this, so the
+        # snapshot must be at least that new.
+        covered = hub.last_id()
+        ids = sorted(lot_ids) if lot_ids is not None else lots.list_lot_ids()
+        states = [_state(lot) for lot in lots.get_lots(ids)]
+        # Do not hold a pooled connection for the life of the stream.
+        db.close_connection()
+        return covered, _format(covered, "snapshot", {"lots": states})
+
+    # Take the live position first so nothing published meanwhile is lost;
+    # events already covered by the replay or snapshot are skipped below.
+    position = hub.position()
+    backlog = hub.replay(last_event_id) if last_event_id is not None else None
+    yield f"retry: {int(config['LOT_EVENTS_RETRY_MS'])}\n\n"
+    if backlog is None:
+        covered, frame = snapshot()
+        yield frame
+    else:
+        covered = last_event_id or 0
+        for event_id, payload in backlog:
+            covered = max(covered, event_id)
+            if wanted(payload):
+                yield _format(event_id, "lot", payload)
+
+    while time.monotonic() < deadline:
+        position, events, missed = hub.wait(position, min(heartbeat, max(0.0, deadline - time.monotonic())))
+        if missed:
+            # This reader fell behind the local log; start over from a snapshot.
+            covered, frame = snapshot()
+            yield frame
+        fresh = [(event_id, payload) for event_id, payload in events if event_id > covered and wanted(payload)]
+        if not fresh:
+            yield ": keepalive\n\n"
+            continue
+        for event_id, payload in fresh:
+            yield _format(event_id, "lot", payload)
+
+
+def parse_lot_ids(text: Optional[str]) -> Optional[Set[int]]:
+    # "1,2,3" -> {1, 2, 3}; empty means every lot. Raises ValueError.
+    if not text:
+        return None
+    return {int(part) for part in text.split(",") if part.strip()}
+
+
+def init_app(app: Flask) -> None:
+    app.config.setdefault("LOT_EVENTS_ENABLED", True)
+    app.config.setdefault("LOT_EVENTS_CHANNEL", "lots:events")
+    # Events kept for Last-Event-ID replay before clients get a snapshot.
+    app.config.setdefault("LOT_EVENTS_BACKLOG", 1000)
+    app.config.setdefault("LOT_EVENTS_HEARTBEAT", 15)
+    app.config.setdefault("LOT_EVENTS_RETRY_MS", 3000)
+    app.config.setdefault("LOT_EVENTS_MAX_STREAM_SECONDS", 300)
@@ -0,0 +1,232 @@
+"""Request, query and cache metrics exposed in Prometheus text format."""
+
+from __future__ import annotations
+
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from flask import Flask, Response, abort, current_app, g, has_app_context, request
+
+from .extensions import cache
+from .models import db
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """Cumulative-bucket histogram; callers hold the registry lock."""
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self) -> Iterable[Tuple[str, float]]:
+        running = 0
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            yield _format_bound(bound), running
+        yield "+Inf", self.count
+
+
+class Registry:
+    """Process-wide metric store; each worker process reports its own."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.requests: Counter[Tuple[str, str, int]] = Counter()
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.queries_per_request = Histogram(QUERY_COUNT_BUCKETS)
+        self.in_flight = 0
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.slow_queries = 0
+
+    def request_started(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+
+    def request_finished(self, method: str, route: str, status: int, seconds: float, queries: int) -> None:
+        with self._lock:
+            self.requests[(method, route, status)] += 1
+            histogram = self.latency.get((method, route))
+            if histogram is None:
+                histogram = self.latency[(method, route)] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+            self.queries_per_request.observe(queries)
+
+    def request_closed(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def query(self, seconds: float, slow: bool) -> None:
+        with self._lock:
+            self.queries += 1
+            self.query_seconds += seconds
+            if slow:
+                self.slow_queries += 1
+
+    def render(self) -> str:
+        lines: List[str] = []
+
+        def family(name: str, kind: str, help_text: str) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            family("parking_http_requests_total", "counter", "HTTP requests by route and status.")
+            for (method, route, status), count in sorted(self.requests.items()):
+                lines.append(
+                    f"parking_http_requests_total{_labels(method=method, route=route, status=status)} {count}"
+                )
+            family("parking_http_request_duration_seconds", "histogram", "HTTP request latency.")
+            for (method, route), histogram in sorted(self.latency.items()):
+                _histogram_lines(lines, "parking_http_request_duration_seconds", histogram, method=method, route=route)
+            family("parking_http_requests_in_flight", "gauge", "Requests currently being served.")
+            lines.append(f"parking_http_requests_in_flight {self.in_flight}")
+            family("parking_http_request_db_queries", "histogram", "SQL statements issued per request.")
+            _histogram_lines(lines, "parking_http_request_db_queries", self.queries_per_request)
+            family("parking_db_queries_total", "counter", "SQL statements executed.")
+            lines.append(f"parking_db_queries_total {self.queries}")
+            family("parking_db_query_duration_seconds_total", "counter", "Time spent executing SQL statements.")
+            lines.append(f"parking_db_query_duration_seconds_total {self.query_seconds:.6f}")
+            family("parking_db_slow_queries_total", "counter", "Statements slower than SLOW_QUERY_MS.")
+            lines.append(f"parking_db_slow_queries_total {self.slow_queries}")
+        _cache_lines(lines, family)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+_slow_query_seconds = 0.1
+
+
+def _format_bound(bound: float) -> str:
+    return f"{bound:g}"
+
+
+def _escape(value: object) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels: object) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _histogram_lines(lines: List[str], name: str, histogram: Histogram, **labels: object) -> None:
+    for bound, count in histogram.samples():
+        lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {count}")
+    lines.append(f"{name}_sum{_labels(**labels)} {histogram.sum:.6f}")
+    lines.append(f"{name}_count{_labels(**labels)} {histogram.count}")
+
+
+def _cache_lines(lines: List[str], family: Any) -> None:
+    stats = getattr(cache.cache, "stats", None) if has_app_context() else None
+    if stats is None:
+        return
+    snapshot = stats()
+    tiers = {"l1": snapshot.get("l1", {}), "l2": snapshot.get("l2", {})}
+    for field, kind in (("hits", "counter"), ("misses", "counter"), ("evictions", "counter")):
+        name = f"parking_cache_{field}_total"
+        family(name, kind, f"Cache {field} by tier.")
+        for tier, values in tiers.items():
+            if field in values:
+                lines.append(f"{name}{_labels(tier=tier)} {values[field]}")
+    family("parking_cache_entries", "gauge", "Entries held in the worker-local cache.")
+    lines.append(f"parking_cache_entries{_labels(tier='l1')} {tiers['l1'].get('size', 0)}")
+
+
+def _compact_sql(sql: str) -> str:
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+def _observe_query(sql: str, seconds: float) -> None:
+    slow = seconds >= _slow_query_seconds
+    registry.query(seconds, slow)
+    if has_app_context():
+        stats = g.get("_metrics_queries")
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += seconds
+    if slow:
+        logger.warning("slow query %.1f ms: %s", seconds * 1000, _compact_sql(sql))
+
+
+def _before_request() -> None:
+    g._metrics_started = time.perf_counter()
+    g._metrics_queries = [0, 0.0]
+    g._metrics_recorded = False
+    registry.request_started()
+
+
+def _route() -> str:
+    # Use the URL rule, not the path, to keep label cardinality bounded.
+    rule = request.url_rule
+    return rule.rule if rule is not None else "unmatched"
+
+
+def _after_request(response: Response) -> Response:
+    started = g.get("_metrics_started")
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    queries, query_seconds = g._metrics_queries
+    registry.request_finished(request.method, _route(), response.status_code, elapsed, queries)
+    g._metrics_recorded = True
+    if current_app.config["SERVER_TIMING"]:
+        response.headers.add(
+            "Server-Timing",
+            f'app;dur={elapsed * 1000:.1f}, db;dur={query_seconds * 1000:.1f};desc="{queries} queries"',
+        )
+    return response
+
+
+def _teardown_request(exc: Optional[BaseException]) -> None:
+    started = g.get("_metrics_started")
+    if started is None:
+        return
+    if not g.get("_metrics_recorded"):
+        # The view raised and no response passed through after_request.
+        queries = g._metrics_queries[0]
+        registry.request_finished(request.method, _route(), 500, time.perf_counter() - started, queries)
+    registry.request_closed()
+
+
+def metrics_view() -> Response:
+    token = current_app.config["METRICS_TOKEN"]
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        abort(403, description="metrics token required")
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+def init_app(app: Flask) -> None:
+    global _slow_query_seconds
+    app.config.setdefault("METRICS_ENABLED", True)
+    app.config.setdefault("METRICS_TOKEN", None)
+    app.config.setdefault("SERVER_TIMING", True)
+    app.config.setdefault("SLOW_QUERY_MS", 100)
+    if not app.config["METRICS_ENABLED"]:
+        # Nothing is hooked in: no observer, no request callbacks.
+        db.set_query_observer(None)
+        return
+    _slow_query_seconds = float(app.config["SLOW_QUERY_MS"]) / 1000
+    db.set_query_observer(_observe_query)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
@@ -1,10 +1,18 @@
 """Models package exposing database helpers and entities."""
 
-from .db import DB_PATH, get_connection, initialize_database, row_to_dict, rows_to_dicts  # noqa: F401
-from . import users, lots, reservations, export_jobs  # noqa: F401
+from .db import (  # noqa: F401
+    DB_PATH,
+    close_connection,
+    get_connection,
+    initialize_database,
+    row_to_dict,
+    rows_to_dicts,
+)
+from . import users, lots, reservations, export_jobs, migrations, rollups, task_runs, archive  # noqa: F401
 
 __all__ = [
     "DB_PATH",
+    "close_connection",
     "get_connection",
     "initialize_database",
     "row_to_dict",
@@ -13,4 +21,8 @@ __all__ = [
     "lots",
     "reservations",
     "export_jobs",
+    "migrations",
+    "rollups",
+    "task_runs",
+    "archive",
 ]
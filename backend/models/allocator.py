@@ -0,0 +1,113 @@
+"""In-memory free-spot allocator backed by per-lot min-heaps."""
+
+from __future__ import annotations
+
+import heapq
+import sqlite3
+import threading
+from typing import Iterable
+
+
+class LotAllocator:
+    """Free spot ids of a single lot, lowest id first.
+
+    The heap mirrors ``parking_spots`` rows with status ``'A'``; ``_free``
+    guards against pushing an id twice after a rollback or release.
+    """
+
+    def __init__(self, lot_id: int, spot_ids: Iterable[int]) -> None:
+        self.lot_id = lot_id
+        self._heap = sorted(int(spot_id) for spot_id in spot_ids)
+        self._free = set(self._heap)
+
+    def __len__(self) -> int:
+        return len(self._free)
+
+    def pop(self) -> int | None:
+        while self._heap:
+            spot_id = heapq.heappop(self._heap)
+            if spot_id in self._free:
+                self._free.discard(spot_id)
+                return spot_id
+        return None
+
+    def discard(self, spot_id: int) -> None:
+        # Lazy deletion: the id stays in the heap but is skipped by pop().
+        self._free.discard(spot_id)
+
+    def push(self, spot_id: int) -> None:
+        if spot_id not in self._free:
+            self._free.add(spot_id)
+            heapq.heappush(self._heap, spot_id)
+
+
+class SpotAllocator:
+    """Process-local cache of free spots per lot, loaded lazily.
+
+    SQLite stays the source of truth: every pick is applied with a guarded
+    UPDATE inside the caller's write transaction, and a lot is reloaded
+    when its heap runs dry or hands out a spot that is no longer free (for
+    example after another worker process booked or released one).
+    """
+
+    def __init__(self) -> None:
+        self._lots: dict[int, LotAllocator] = {}
+        self._lock = threading.RLock()
+
+    def _load(self, conn: sqlite3.Connection, lot_id: int) -> LotAllocator:
+        rows = conn.execute(
+            "SELECT id FROM parking_spots WHERE lot_id = ? AND status = 'A' ORDER BY id",
+            (lot_id,),
+        ).fetchall()
+        lot = LotAllocator(lot_id, (row["id"] for row in rows))
+        self._lots[lot_id] = lot
+        return lot
+
+    def claim(self, conn: sqlite3.Connection, lot_id: int, quantity: int) -> list[int]:
+        # Mark up to ``quantity`` free spots occupied, lowest ids first. Must
+        # run inside the caller's write transaction (BEGIN IMMEDIATE) so a
+        # rollback can be paired with restore().
+        with self._lock:
+            lot = self._lots.get(lot_id) or self._load(conn, lot_id)
+            claimed: list[int] = []
+            reloaded = False
+            while len(claimed) < quantity:
+                spot_id = lot.pop()
+                if spot_id is not None:
+                    # The guarded UPDATE doubles as the consistency check.
+                    cursor = conn.execute(
+                        "UPDATE parking_spots SET status = 'O' WHERE id = ? AND lot_id = ? AND status = 'A'",
+                        (spot_id, lot_id),
+                    )
+                    if cursor.rowcount == 1:
+                        claimed.append(spot_id)
+                        continue
+                if reloaded:
+                    break
+                # Empty or stale heap: another process may have booked or
+                # released spots, so rebuild from the database once.
+                lot = self._load(conn, lot_id)
+                reloaded = True
+            return claimed
+
+    def restore(self, lot_id: int, spot_ids: Iterable[int]) -> None:
+        # Give back spots whose booking transaction rolled back.
+        with self._lock:
+            lot = self._lots.get(lot_id)
+            if lot is not None:
+                for spot_id in spot_ids:
+                    lot.push(int(spot_id))
+
+    def release(self, lot_id: int, spot_id: int) -> None:
+        # Record a spot freed by a committed release.
+        self.restore(lot_id, (spot_id,))
+
+    def invalidate(self, lot_id: int | None = None) -> None:
+        with self._lock:
+            if lot_id is None:
+                self._lots.clear()
+            else:
+                self._lots.pop(lot_id, None)
+
+
+allocator = SpotAllocator()
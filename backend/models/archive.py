@@ -0,0 +1,86 @@
+"""Move old closed reservations out of the hot table."""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from .db import begin_immediate, get_connection
+from .rollups import ROLLUP_NAME
+
+
+def archive_closed(older_than_days: int, batch_size: int = 1000, max_batches: Optional[int] = None) -> int:
+    # Move reservations released more than ``older_than_days`` ago into
+    # reservations_archive, one short write transaction per batch so
+    # bookings are never blocked for long. Rows not yet folded into the
+    # usage rollups stay put. Returns the number of rows moved.
+    cutoff = (datetime.utcnow() - timedelta(days=older_than_days)).isoformat()
+    conn = get_connection()
+    moved = batches = 0
+    while max_batches is None or batches < max_batches:
+        begin_immediate(conn)
+        try:
+            ids = [
+                row[0]
+                for row in conn.execute(
+                    """
+                    SELECT r.id FROM reservations AS r
+                    WHERE r.left_at IS NOT NULL AND r.left_at < ?
+                      AND (r.left_at, r.id) <= (
+                          SELECT last_left_at, last_id FROM rollup_state WHERE name = ?
+                      )
+                    ORDER BY r.left_at, r.id
+                    LIMIT ?
+                    """,
+                    (cutoff, ROLLUP_NAME, batch_size),
+                )
+            ]
+            if not ids:
+                conn.rollback()
+                break
+            placeholders = ", ".join("?" for _ in ids)
+            conn.execute(
+                f"""
+                INSERT INTO reservations_archive
+                    (id, spot_id, lot_id, lot_name, user_id, vehicle_number, parked_at, left_at, cost)
+                SELECT r.id, r.spot_id, s.lot_id, l.name, r.user_id, r.vehicle_number,
+                       r.parked_at, r.left_at, r.cost
+                FROM reservations AS r
+                LEFT JOIN parking_spots AS s ON s.id = r.spot_id
+                LEFT JOIN parking_lots AS l ON l.id = s.lot_id
+                WHERE r.id IN ({placeholders})
+                """,
+                ids,
+            )
+            conn.execute(f"DELETE FROM reservations WHERE id IN ({placeholders})", ids)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        moved += len(ids)
+        batches += 1
+        if len(ids) < batch_size:
+            break
+    return moved
+
+
+def compact(vacuum: bool = True) -> None:
+    # Refresh planner statistics for both tables and return the freed pages
+    # to the filesystem. VACUUM rewrites the whole file, so it is left to
+    # the off-peak archival run.
+    conn = get_connection()
+    conn.commit()
+    conn.execute("ANALYZE reservations")
+    conn.execute("ANALYZE reservations_archive")
+    conn.commit()
+    if vacuum:
+        conn.execute("VACUUM")
+
+
+def archive_stats() -> Dict[str, object]:
+    with get_connection() as conn:
+        hot = conn.execute("SELECT COUNT(*) FROM reservations").fetchone()[0]
+        row = conn.execute(
+            "SELECT COUNT(*) AS archived, MIN(parked_at) AS oldest, MAX(left_at) AS newest FROM reservations_archive"
+        ).fetchone()
+    return {"hot": int(hot), "archived": int(row["archived"]), "oldest": row["oldest"], "newest": row["newest"]}
@@ -2,13 +2,41 @@
 
 from __future__ import annotations
 
+import os
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Iterable, Sequence
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
 
+from flask import Flask, g, has_app_context
 from werkzeug.security import generate_password_hash
 
-DB_PATH = Path(__file__).resolve().parent.parent / "parking.db"
+DB_PATH = Path(
+    os.environ.get("PARKING_DB_PATH", Path(__file__).resolve().parent.parent / "parking.db")
+)
+DEFAULT_POOL_SIZE = 8
+
+# Performance profile applied to every pooled connection; override any key
+# through the ``SQLITE_PRAGMAS`` config mapping.
+DEFAULT_PRAGMAS: dict[str, Any] = {
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "busy_timeout": 5000,
+    "cache_size": -16000,
+    "mmap_size": 134217728,
+    "temp_store": "memory",
+}
+# journal_mode is persistent in the database file, so it is only set once
+# from initialize_database() rather than on every connect.
+_DATABASE_PRAGMAS = ("journal_mode",)
+_PRAGMA_KEYWORDS = {
+    "journal_mode": {"delete", "truncate", "persist", "memory", "wal", "off"},
+    "synchronous": {"off", "normal", "full", "extra"},
+    "temp_store": {"default", "file", "memory"},
+}
+CHECKPOINT_MODES = ("PASSIVE", "FULL", "RESTART", "TRUNCATE")
 
 SCHEMA: Sequence[str] = (
     """
@@ -67,20 +95,278 @@ SCHEMA: Sequence[str] = (
 )
 
 
+# Called with (sql, seconds) after each statement when instrumentation is on.
+_query_observer: Optional[Callable[[str, float], None]] = None
+
+
+def set_query_observer(observer: Optional[Callable[[str, float], None]]) -> None:
+    global _query_observer
+    _query_observer = observer
+
+
+# Per-thread statement recorders (see capture_queries()).
+_captures = threading.local()
+
+
+@contextmanager
+def capture_queries() -> Iterator[List[Tuple[str, float]]]:
+    # Record the statements this thread runs inside the block, with their
+    # timings. The global observer keeps seeing them too; other threads'
+    # queries are never captured.
+    statements: List[Tuple[str, float]] = []
+    previous = getattr(_captures, "statements", None)
+    _captures.statements = statements
+    try:
+        yield statements
+    finally:
+        _captures.statements = previous
+
+
+def _report(
+    sql: str,
+    seconds: float,
+    observer: Optional[Callable[[str, float], None]],
+    captured: Optional[List[Tuple[str, float]]],
+) -> None:
+    if observer is not None:
+        observer(sql, seconds)
+    if captured is not None:
+        captured.append((sql, seconds))
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection that reports statement timings to the query observer.
+
+    With no observer or capture active the overhead is one global and one
+    thread-local lookup per call.
+    """
+
+    def execute(self, sql: str, parameters: Any = (), /) -> sqlite3.Cursor:  # type: ignore[override]
+        observer = _query_observer
+        captured = getattr(_captures, "statements", None)
+        if observer is None and captured is None:
+            return super().execute(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _report(sql, time.perf_counter() - started, observer, captured)
+
+    def executemany(self, sql: str, parameters: Iterable[Any], /) -> sqlite3.Cursor:  # type: ignore[override]
+        observer = _query_observer
+        captured = getattr(_captures, "statements", None)
+        if observer is None and captured is None:
+            return super().executemany(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            _report(sql, time.perf_counter() - started, observer, captured)
+
+
+class ConnectionPool:
+    """Bounded pool of reusable SQLite connections.
+
+    Idle connections are kept up to ``max_size``; connections checked out
+    beyond that limit are closed on release instead of being pooled.
+    """
+
+    def __init__(
+        self,
+        path: Path | str,
+        max_size: int = DEFAULT_POOL_SIZE,
+        pragmas: dict[str, Any] | None = None,
+    ) -> None:
+        self.path = Path(path)
+        self.max_size = max_size
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self._idle: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _connect(self) -> sqlite3.Connection:
+        timeout = float(self.pragmas.get("busy_timeout", 5000)) / 1000
+        conn = sqlite3.connect(self.path, timeout=timeout, check_same_thread=False, factory=TimedConnection)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        for name, value in self.pragmas.items():
+            if name not in _DATABASE_PRAGMAS:
+                conn.execute(_pragma_statement(name, value))
+        return conn
+
+    def _discard_inherited(self) -> None:
+        # Connections must never cross a fork (Celery prefork workers).
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            self._idle.clear()
+            self._pid = os.getpid()
+
+    def acquire(self) -> sqlite3.Connection:
+        self._discard_inherited()
+        while True:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                return self._connect()
+            if _is_healthy(conn):
+                return conn
+            _close_quietly(conn)
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            _close_quietly(conn)
+            return
+        with self._lock:
+            if self._pid == os.getpid() and len(self._idle) < self.max_size:
+                self._idle.append(conn)
+                return
+        _close_quietly(conn)
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            _close_quietly(conn)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {"path": str(self.path), "max_size": self.max_size, "idle": len(self._idle)}
+
+
+def _pragma_statement(name: str, value: Any) -> str:
+    # PRAGMA values cannot be bound as parameters, so validate them here.
+    if name not in DEFAULT_PRAGMAS:
+        raise ValueError(f"unsupported pragma: {name}")
+    if name in _PRAGMA_KEYWORDS:
+        keyword = str(value).lower()
+        if keyword not in _PRAGMA_KEYWORDS[name]:
+            raise ValueError(f"invalid value for {name}: {value!r}")
+        return f"PRAGMA {name} = {keyword}"
+    return f"PRAGMA {name} = {int(value)}"
+
+
+def _is_healthy(conn: sqlite3.Connection) -> bool:
+    try:
+        conn.execute("SELECT 1").fetchone()
+    except sqlite3.Error:
+        return False
+    return True
+
+
+def _close_quietly(conn: sqlite3.Connection) -> None:
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
+
+
+_pool = ConnectionPool(DB_PATH)
+_local = threading.local()
+
+
+def configure_pool(
+    path: Path | str | None = None,
+    max_size: int | None = None,
+    pragmas: dict[str, Any] | None = None,
+) -> ConnectionPool:
+    # Swap the process-wide pool, closing idle connections of the old one.
+    global _pool
+    old = _pool
+    _pool = ConnectionPool(
+        path or old.path,
+        max_size or old.max_size,
+        old.pragmas if pragmas is None else pragmas,
+    )
+    old.close_all()
+    return _pool
+
+
+def get_pool() -> ConnectionPool:
+    return _pool
+
+
 def get_connection() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON")
+    # Reuse one pooled connection per app context (requests, Celery tasks)
+    # or per thread when running outside Flask.
+    if has_app_context():
+        conn = g.get("_db_conn")
+        if conn is None:
+            conn = g._db_conn = _pool.acquire()
+        return conn
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = _pool.acquire()
     return conn
 
 
+def begin_immediate(conn: sqlite3.Connection) -> None:
+    # Take the write lock up front so read-then-write sequences cannot race.
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+
+
+def close_connection(exc: BaseException | None = None) -> None:
+    # Return the current context's connection to the pool.
+    if has_app_context():
+        conn = g.pop("_db_conn", None)
+        if conn is not None:
+            _pool.release(conn)
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        _local.conn = None
+        _pool.release(conn)
+
+
+def init_app(app: Flask) -> None:
+    app.config.setdefault("DATABASE_PATH", str(DB_PATH))
+    app.config.setdefault("DB_POOL_SIZE", DEFAULT_POOL_SIZE)
+    app.config.setdefault("SQLITE_PRAGMAS", {})
+    app.config.setdefault("SQLITE_CHECKPOINT_MODE", "TRUNCATE")
+    app.config.setdefault("DB_AUTO_MIGRATE", True)
+    pragmas = {**DEFAULT_PRAGMAS, **app.config["SQLITE_PRAGMAS"]}
+    for name, value in pragmas.items():
+        _pragma_statement(name, value)
+    configure_pool(app.config["DATABASE_PATH"], int(app.config["DB_POOL_SIZE"]), pragmas)
+    app.teardown_appcontext(close_connection)
+
+
+def effective_pragmas() -> dict[str, Any]:
+    # Report the settings SQLite is actually using on a pooled connection.
+    conn = get_connection()
+    settings: dict[str, Any] = {}
+    for name in ("foreign_keys", *DEFAULT_PRAGMAS):
+        row = conn.execute(f"PRAGMA {name}").fetchone()
+        settings[name] = row[0] if row else None
+    return {"configured": dict(_pool.pragmas), "effective": settings, "pool": _pool.stats()}
+
+
+def checkpoint(mode: str = "TRUNCATE") -> dict[str, int]:
+    # Fold the WAL back into the main database file.
+    mode = mode.upper()
+    if mode not in CHECKPOINT_MODES:
+        raise ValueError(f"invalid checkpoint mode: {mode}")
+    row = get_connection().execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+    return {"busy": int(row[0]), "log_frames": int(row[1]), "checkpointed_frames": int(row[2])}
+
+
 def initialize_database() -> None:
     # Initialize database schema.
-    with get_connection() as conn:
-        for statement in SCHEMA:
-            conn.execute(statement)
-        conn.commit()
-    ensure_admin()
+    try:
+        with get_connection() as conn:
+            for name in _DATABASE_PRAGMAS:
+                if name in _pool.pragmas:
+                    conn.execute(_pragma_statement(name, _pool.pragmas[name]))
+            for statement in SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+        ensure_admin()
+    finally:
+        close_connection()
 
 
 def ensure_admin() -> None:
@@ -2,47 +2,179 @@
 
 from __future__ import annotations
 
+import sqlite3
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Tuple
 
-from .db import get_connection, row_to_dict, rows_to_dicts
+from flask import current_app
 
-EXPORT_DIR = Path(__file__).resolve().parent.parent / "exports"
-EXPORT_DIR.mkdir(exist_ok=True)
+from .db import begin_immediate, get_connection, row_to_dict, rows_to_dicts
 
+FORMATS = ("csv", "csv.gz")
+# full: whole history; range: parked_at within [range_start, range_end);
+# delta: rows parked or released since the user's previous export.
+MODES = ("full", "range", "delta")
+# Queued/processing jobs older than this are assumed lost and not reused.
+IN_FLIGHT_TIMEOUT_MINUTES = 60
 
-def create_job(user_id: int) -> dict[str, object]:
+
+def export_dir() -> Path:
+    # Where export files are written (EXPORT_DIR), created on first use.
+    path = Path(current_app.config["EXPORT_DIR"])
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _validate(file_format: str, mode: str) -> None:
+    if file_format not in FORMATS:
+        raise ValueError(f"unsupported export format: {file_format}")
+    if mode not in MODES:
+        raise ValueError(f"unsupported export mode: {mode}")
+
+
+def _insert(
+    conn: sqlite3.Connection,
+    user_id: int,
+    file_format: str,
+    mode: str,
+    range_start: str | None,
+    range_end: str | None,
+) -> sqlite3.Row | None:
+    cursor = conn.execute(
+        """
+        INSERT INTO export_jobs (user_id, status, format, mode, range_start, range_end)
+        VALUES (?, 'queued', ?, ?, ?, ?)
+        """,
+        (user_id, file_format, mode, range_start, range_end),
+    )
+    return conn.execute("SELECT * FROM export_jobs WHERE id = ?", (cursor.lastrowid,)).fetchone()
+
+
+def create_job(
+    user_id: int,
+    file_format: str = "csv",
+    mode: str = "full",
+    range_start: str | None = None,
+    range_end: str | None = None,
+) -> dict[str, object]:
+    _validate(file_format, mode)
     with get_connection() as conn:
-        cursor = conn.execute(
-            "INSERT INTO export_jobs (user_id, status) VALUES (?, 'queued')",
-            (user_id,),
-        )
+        row = _insert(conn, user_id, file_format, mode, range_start, range_end)
         conn.commit()
-        row = conn.execute("SELECT * FROM export_jobs WHERE id = ?", (cursor.lastrowid,)).fetchone()
     return row_to_dict(row) or {}
 
 
+def create_or_reuse_job(
+    user_id: int,
+    file_format: str,
+    watermark: str,
+    mode: str = "full",
+    range_start: str | None = None,
+    range_end: str | None = None,
+) -> Tuple[str, dict[str, object]]:
+    # Returns ("in_flight" | "reused" | "created", job). Runs under the write
+    # lock so concurrent clicks cannot both enqueue a new job.
+    _validate(file_format, mode)
+    with get_connection() as conn:
+        begin_immediate(conn)
+        row = conn.execute(
+            """
+            SELECT * FROM export_jobs
+            WHERE user_id = ? AND format = ? AND mode = ? AND range_start IS ? AND range_end IS ?
+              AND status IN ('queued', 'processing') AND created_at >= datetime('now', ?)
+            ORDER BY id DESC LIMIT 1
+            """,
+            (user_id, file_format, mode, range_start, range_end, f"-{IN_FLIGHT_TIMEOUT_MINUTES} minutes"),
+        ).fetchone()
+        if row is not None:
+            conn.rollback()
+            return "in_flight", row_to_dict(row) or {}
+        # A delta file only holds changes up to its own window, so it is
+        # never handed out again.
+        if mode != "delta":
+            row = conn.execute(
+                """
+                SELECT * FROM export_jobs
+                WHERE user_id = ? AND format = ? AND mode = ? AND range_start IS ? AND range_end IS ?
+                  AND status = 'completed' AND watermark = ?
+                ORDER BY id DESC LIMIT 1
+                """,
+                (user_id, file_format, mode, range_start, range_end, watermark),
+            ).fetchone()
+            if row is not None and row["file_path"] and Path(row["file_path"]).exists():
+                conn.rollback()
+                return "reused", row_to_dict(row) or {}
+        row = _insert(conn, user_id, file_format, mode, range_start, range_end)
+        conn.commit()
+    return "created", row_to_dict(row) or {}
+
+
+def last_delivered_until(user_id: int) -> Optional[str]:
+    # Upper bound of the newest completed full or delta export; the next
+    # delta starts right after it.
+    with get_connection() as conn:
+        row = conn.execute(
+            """
+            SELECT MAX(until_at) AS until_at FROM export_jobs
+            WHERE user_id = ? AND status = 'completed' AND mode IN ('full', 'delta')
+            """,
+            (user_id,),
+        ).fetchone()
+    return row["until_at"] if row else None
+
+
 def get_job(job_id: int) -> Optional[dict[str, object]]:
     with get_connection() as conn:
         row = conn.execute("SELECT * FROM export_jobs WHERE id = ?", (job_id,)).fetchone()
     return row_to_dict(row)
 
 
-def mark_processing(job_id: int) -> None:
+def mark_processing(
+    job_id: int,
+    watermark: str | None = None,
+    total_rows: int | None = None,
+    since_at: str | None = None,
+    until_at: str | None = None,
+) -> None:
     with get_connection() as conn:
-        conn.execute("UPDATE export_jobs SET status = 'processing' WHERE id = ?", (job_id,))
+        conn.execute(
+            """
+            UPDATE export_jobs
+            SET status = 'processing', watermark = ?, total_rows = ?, rows_written = 0,
+                since_at = ?, until_at = ?
+            WHERE id = ?
+            """,
+            (watermark, total_rows, since_at, until_at, job_id),
+        )
         conn.commit()
 
 
-def mark_completed(job_id: int, file_path: str) -> None:
+def update_progress(job_id: int, rows_written: int) -> None:
+    with get_connection() as conn:
+        conn.execute("UPDATE export_jobs SET rows_written = ? WHERE id = ?", (rows_written, job_id))
+        conn.commit()
+
+
+def mark_completed(job_id: int, file_path: str, rows_written: int | None = None) -> None:
     with get_connection() as conn:
         conn.execute(
-            "UPDATE export_jobs SET status = 'completed', file_path = ?, completed_at = CURRENT_TIMESTAMP WHERE id = ?",
-            (file_path, job_id),
+            """
+            UPDATE export_jobs
+            SET status = 'completed', file_path = ?, completed_at = CURRENT_TIMESTAMP,
+                rows_written = COALESCE(?, rows_written)
+            WHERE id = ?
+            """,
+            (file_path, rows_written, job_id),
         )
         conn.commit()
 
 
+def mark_failed(job_id: int) -> None:
+    with get_connection() as conn:
+        conn.execute("UPDATE export_jobs SET status = 'failed' WHERE id = ?", (job_id,))
+        conn.commit()
+
+
 def list_jobs_for_user(user_id: int) -> list[dict[str, object]]:
     with get_connection() as conn:
         rows = conn.execute(
@@ -4,7 +4,8 @@ from __future__ import annotations
 
 from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-from .db import get_connection, row_to_dict, rows_to_dicts
+from .allocator import allocator
+from .db import begin_immediate, get_connection, row_to_dict, rows_to_dicts
 
 
 def _normalize_lot(row: Dict[str, Any] | None) -> Dict[str, Any] | None:
@@ -19,24 +20,48 @@ def _normalize_lot(row: Dict[str, Any] | None) -> Dict[str, Any] | None:
 
 
 def list_all_lots(include_available: bool = False) -> List[Dict[str, Any]]:
+    columns = "id, name, price_per_hour, address, pin_code, total_spots, created_at"
+    if include_available:
+        # Counters are kept current by the parking_spots triggers.
+        columns += ", available_count AS available_spots"
+    with get_connection() as conn:
+        rows = conn.execute(f"SELECT {columns} FROM parking_lots ORDER BY id").fetchall()
+    return [_normalize_lot(row) for row in rows_to_dicts(rows)]
+
+
+def list_lot_ids() -> List[int]:
+    with get_connection() as conn:
+        rows = conn.execute("SELECT id FROM parking_lots ORDER BY id").fetchall()
+    return [int(row["id"]) for row in rows]
+
+
+def get_lots(lot_ids: Iterable[int]) -> List[Dict[str, Any]]:
+    # Fetch lots with their availability counters in one query.
+    ids = list(lot_ids)
+    if not ids:
+        return []
+    placeholders = ", ".join("?" for _ in ids)
     with get_connection() as conn:
         rows = conn.execute(
-            "SELECT id, name, price_per_hour, address, pin_code, total_spots, created_at FROM parking_lots ORDER BY id"
+            f"""
+            SELECT id, name, price_per_hour, address, pin_code, total_spots, created_at,
+                   available_count AS available_spots, occupied_count AS occupied_spots
+            FROM parking_lots
+            WHERE id IN ({placeholders})
+            ORDER BY id
+            """,
+            ids,
         ).fetchall()
-        lots = [_normalize_lot(row) for row in rows_to_dicts(rows)]
-        if include_available:
-            for lot in lots:
-                lot["available_spots"] = available_spots(int(lot["id"]))
-        return lots
+    return [_normalize_lot(row) for row in rows_to_dicts(rows)]
 
 
 def available_spots(lot_id: int) -> int:
     with get_connection() as conn:
         row = conn.execute(
-            "SELECT COUNT(*) AS cnt FROM parking_spots WHERE lot_id = ? AND status = 'A'",
+            "SELECT available_count FROM parking_lots WHERE id = ?",
             (lot_id,),
         ).fetchone()
-    return int(row["cnt"]) if row else 0
+    return int(row["available_count"]) if row else 0
 
 
 def create_lot(name: str, price_per_hour: float, total_spots: int, address: str | None, pin_code: str | None) -> Dict[str, Any]:
@@ -51,7 +76,10 @@ def create_lot(name: str, price_per_hour: float, total_spots: int, address: str
             [(lot_id,) for _ in range(total_spots)],
         )
         conn.commit()
-        row = conn.execute("SELECT * FROM parking_lots WHERE id = ?", (lot_id,)).fetchone()
+        row = conn.execute(
+            "SELECT id, name, price_per_hour, address, pin_code, total_spots, created_at FROM parking_lots WHERE id = ?",
+            (lot_id,),
+        ).fetchone()
     data = _normalize_lot(row_to_dict(row) or {}) or {}
     data["available_spots"] = available_spots(lot_id)
     return data
@@ -109,6 +137,7 @@ def update_lot(
                 (total_spots, lot_id),
             )
         conn.commit()
+        allocator.invalidate(lot_id)
         updated = conn.execute(
             "SELECT id, name, price_per_hour, address, pin_code, total_spots, created_at FROM parking_lots WHERE id = ?",
             (lot_id,),
@@ -125,42 +154,50 @@ def delete_lot(lot_id: int) -> str:
         if exists is None:
             return "not_found"
         occupied = conn.execute(
-            "SELECT COUNT(*) AS cnt FROM parking_spots WHERE lot_id = ? AND status = 'O'",
+            "SELECT occupied_count FROM parking_lots WHERE id = ?",
             (lot_id,),
         ).fetchone()
-        if occupied and int(occupied["cnt"]) > 0:
+        if occupied and int(occupied["occupied_count"]) > 0:
             return "occupied"
         conn.execute("DELETE FROM parking_spots WHERE lot_id = ?", (lot_id,))
         deleted = conn.execute("DELETE FROM parking_lots WHERE id = ?", (lot_id,))
         conn.commit()
+        allocator.invalidate(lot_id)
         return "deleted" if deleted.rowcount else "not_found"
 
 
 def admin_dashboard_stats() -> Dict[str, int]:
     with get_connection() as conn:
-        lots = conn.execute("SELECT COUNT(*) AS cnt FROM parking_lots").fetchone()
-        spots = conn.execute("SELECT COUNT(*) AS cnt FROM parking_spots").fetchone()
-        occupied = conn.execute(
-            "SELECT COUNT(*) AS cnt FROM parking_spots WHERE status = 'O'"
+        row = conn.execute(
+            """
+            SELECT COUNT(*) AS lots,
+                   COALESCE(SUM(available_count + occupied_count), 0) AS total_spots,
+                   COALESCE(SUM(occupied_count), 0) AS occupied
+            FROM parking_lots
+            """
         ).fetchone()
     return {
-        "lots": int(lots["cnt"]) if lots else 0,
-        "total_spots": int(spots["cnt"]) if spots else 0,
-        "occupied": int(occupied["cnt"]) if occupied else 0,
+        "lots": int(row["lots"]) if row else 0,
+        "total_spots": int(row["total_spots"]) if row else 0,
+        "occupied": int(row["occupied"]) if row else 0,
     }
 
 
+def has_available_lots() -> bool:
+    with get_connection() as conn:
+        row = conn.execute("SELECT EXISTS (SELECT 1 FROM parking_lots WHERE available_count > 0)").fetchone()
+    return bool(row[0])
+
+
 def list_available_lots() -> List[Dict[str, Any]]:
     with get_connection() as conn:
         rows = conn.execute(
             """
-            SELECT l.id, l.name, l.price_per_hour, l.address, l.pin_code, l.total_spots,
-                   COUNT(s.id) AS available_spots
-            FROM parking_lots AS l
-            JOIN parking_spots AS s ON s.lot_id = l.id
-            WHERE s.status = 'A'
-            GROUP BY l.id, l.name, l.price_per_hour, l.address, l.pin_code, l.total_spots
-            ORDER BY l.id
+            SELECT id, name, price_per_hour, address, pin_code, total_spots,
+                   available_count AS available_spots
+            FROM parking_lots
+            WHERE available_count > 0
+            ORDER BY id
             """
         ).fetchall()
     lots = rows_to_dicts(rows)
@@ -169,3 +206,28 @@ def list_available_lots() -> List[Dict[str, Any]]:
         lot["total_spots"] = int(lot["total_spots"])
         lot["available_spots"] = int(lot["available_spots"])
     return lots
+
+
+def reconcile_availability_counters(repair: bool = True) -> List[Dict[str, Any]]:
+    # Compare the denormalized counters with parking_spots and fix any drift.
+    with get_connection() as conn:
+        begin_immediate(conn)
+        rows = conn.execute(
+            """
+            SELECT l.id, l.available_count, l.occupied_count,
+                   COALESCE(SUM(s.status = 'A'), 0) AS actual_available,
+                   COALESCE(SUM(s.status = 'O'), 0) AS actual_occupied
+            FROM parking_lots AS l
+            LEFT JOIN parking_spots AS s ON s.lot_id = l.id
+            GROUP BY l.id
+            HAVING l.available_count != actual_available OR l.occupied_count != actual_occupied
+            """
+        ).fetchall()
+        drift = rows_to_dicts(rows)
+        if repair and drift:
+            conn.executemany(
+                "UPDATE parking_lots SET available_count = ?, occupied_count = ? WHERE id = ?",
+                [(lot["actual_available"], lot["actual_occupied"], lot["id"]) for lot in drift],
+            )
+        conn.commit()
+    return drift
@@ -0,0 +1,291 @@
+"""Versioned schema migrations applied on top of the base schema."""
+
+from __future__ import annotations
+
+import sqlite3
+from dataclasses import dataclass
+from typing import Callable, Sequence, Union
+
+from .db import begin_immediate, get_connection, rows_to_dicts
+
+Step = Union[str, Callable[[sqlite3.Connection], None]]
+
+VERSION_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    steps: Sequence[Step]
+
+
+def column_exists(conn: sqlite3.Connection, table: str, column: str) -> bool:
+    rows = conn.execute(f"PRAGMA table_info({table})").fetchall()
+    return any(row["name"] == column for row in rows)
+
+
+def add_column(table: str, column: str, definition: str) -> Callable[[sqlite3.Connection], None]:
+    # SQLite has no ADD COLUMN IF NOT EXISTS, so guard it for re-runs.
+    def step(conn: sqlite3.Connection) -> None:
+        if not column_exists(conn, table, column):
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    return step
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(
+        1,
+        "index parking spots by lot and availability",
+        (
+            "CREATE INDEX IF NOT EXISTS idx_parking_spots_lot_status ON parking_spots (lot_id, status)",
+            "CREATE INDEX IF NOT EXISTS idx_parking_spots_available ON parking_spots (lot_id, id) WHERE status = 'A'",
+        ),
+    ),
+    Migration(
+        2,
+        "index reservations by user history and spot",
+        (
+            "CREATE INDEX IF NOT EXISTS idx_reservations_user_parked ON reservations (user_id, parked_at)",
+            "CREATE INDEX IF NOT EXISTS idx_reservations_spot ON reservations (spot_id)",
+        ),
+    ),
+    Migration(
+        3,
+        "index export jobs by user",
+        ("CREATE INDEX IF NOT EXISTS idx_export_jobs_user_created ON export_jobs (user_id, created_at)",),
+    ),
+    Migration(
+        4,
+        "maintain per-lot availability counters with triggers",
+        (
+            add_column("parking_lots", "available_count", "INTEGER NOT NULL DEFAULT 0"),
+            add_column("parking_lots", "occupied_count", "INTEGER NOT NULL DEFAULT 0"),
+            """
+            UPDATE parking_lots SET
+                available_count = (SELECT COUNT(*) FROM parking_spots AS s WHERE s.lot_id = parking_lots.id AND s.status = 'A'),
+                occupied_count = (SELECT COUNT(*) FROM parking_spots AS s WHERE s.lot_id = parking_lots.id AND s.status = 'O')
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_parking_spots_insert AFTER INSERT ON parking_spots
+            BEGIN
+                UPDATE parking_lots SET
+                    available_count = available_count + (NEW.status = 'A'),
+                    occupied_count = occupied_count + (NEW.status = 'O')
+                WHERE id = NEW.lot_id;
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_parking_spots_delete AFTER DELETE ON parking_spots
+            BEGIN
+                UPDATE parking_lots SET
+                    available_count = available_count - (OLD.status = 'A'),
+                    occupied_count = occupied_count - (OLD.status = 'O')
+                WHERE id = OLD.lot_id;
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_parking_spots_update AFTER UPDATE OF status, lot_id ON parking_spots
+            WHEN OLD.status IS NOT NEW.status OR OLD.lot_id IS NOT NEW.lot_id
+            BEGIN
+                UPDATE parking_lots SET
+                    available_count = available_count - (OLD.status = 'A'),
+                    occupied_count = occupied_count - (OLD.status = 'O')
+                WHERE id = OLD.lot_id;
+                UPDATE parking_lots SET
+                    available_count = available_count + (NEW.status = 'A'),
+                    occupied_count = occupied_count + (NEW.status = 'O')
+                WHERE id = NEW.lot_id;
+            END
+            """,
+        ),
+    ),
+    Migration(
+        5,
+        "record export file format",
+        (add_column("export_jobs", "format", "TEXT NOT NULL DEFAULT 'csv'"),),
+    ),
+    Migration(
+        6,
+        "track export progress and source watermark",
+        (
+            add_column("export_jobs", "rows_written", "INTEGER NOT NULL DEFAULT 0"),
+            add_column("export_jobs", "total_rows", "INTEGER"),
+            add_column("export_jobs", "watermark", "TEXT"),
+        ),
+    ),
+    Migration(
+        7,
+        "support ranged and incremental exports",
+        (
+            add_column("export_jobs", "mode", "TEXT NOT NULL DEFAULT 'full'"),
+            add_column("export_jobs", "range_start", "TEXT"),
+            add_column("export_jobs", "range_end", "TEXT"),
+            add_column("export_jobs", "since_at", "TEXT"),
+            add_column("export_jobs", "until_at", "TEXT"),
+            "CREATE INDEX IF NOT EXISTS idx_reservations_user_left ON reservations (user_id, left_at)",
+        ),
+    ),
+    Migration(
+        8,
+        "record background task runs",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS task_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                task TEXT NOT NULL,
+                status TEXT NOT NULL,
+                started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                finished_at TIMESTAMP,
+                duration_ms REAL,
+                rows_read INTEGER NOT NULL DEFAULT 0,
+                rows_written INTEGER NOT NULL DEFAULT 0,
+                detail TEXT
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_task_runs_task ON task_runs (task, id)",
+        ),
+    ),
+    Migration(
+        9,
+        "add hourly and daily lot usage rollups",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS lot_usage_hourly (
+                lot_id INTEGER NOT NULL,
+                bucket TEXT NOT NULL,
+                occupied_minutes REAL NOT NULL DEFAULT 0,
+                bookings INTEGER NOT NULL DEFAULT 0,
+                revenue REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (lot_id, bucket)
+            ) WITHOUT ROWID
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS lot_usage_daily (
+                lot_id INTEGER NOT NULL,
+                bucket TEXT NOT NULL,
+                occupied_minutes REAL NOT NULL DEFAULT 0,
+                bookings INTEGER NOT NULL DEFAULT 0,
+                revenue REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (lot_id, bucket)
+            ) WITHOUT ROWID
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_lot_usage_hourly_bucket ON lot_usage_hourly (bucket)",
+            "CREATE INDEX IF NOT EXISTS idx_lot_usage_daily_bucket ON lot_usage_daily (bucket)",
+            """
+            CREATE TABLE IF NOT EXISTS rollup_state (
+                name TEXT PRIMARY KEY,
+                last_left_at TEXT NOT NULL DEFAULT '',
+                last_id INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_reservations_closed
+            ON reservations (left_at, id) WHERE left_at IS NOT NULL
+            """,
+        ),
+    ),
+    Migration(
+        10,
+        "index reservation listings for keyset pagination",
+        (
+            "CREATE INDEX IF NOT EXISTS idx_reservations_parked ON reservations (parked_at)",
+            "CREATE INDEX IF NOT EXISTS idx_reservations_vehicle ON reservations (vehicle_number, parked_at)",
+        ),
+    ),
+    Migration(
+        11,
+        "add reservations archive",
+        (
+            # Lot id and name are copied in: archived rows outlive their
+            # spots and lots.
+            """
+            CREATE TABLE IF NOT EXISTS reservations_archive (
+                id INTEGER PRIMARY KEY,
+                spot_id INTEGER NOT NULL,
+                lot_id INTEGER,
+                lot_name TEXT,
+                user_id INTEGER NOT NULL,
+                vehicle_number TEXT NOT NULL,
+                parked_at DATETIME NOT NULL,
+                left_at DATETIME NOT NULL,
+                cost REAL DEFAULT 0,
+                archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_archive_user_parked ON reservations_archive (user_id, parked_at)",
+            "CREATE INDEX IF NOT EXISTS idx_archive_parked ON reservations_archive (parked_at)",
+            "CREATE INDEX IF NOT EXISTS idx_archive_lot_parked ON reservations_archive (lot_id, parked_at)",
+            "CREATE INDEX IF NOT EXISTS idx_archive_vehicle ON reservations_archive (vehicle_number, parked_at)",
+        ),
+    ),
+]
+
+
+def _ensure_version_table(conn: sqlite3.Connection) -> None:
+    conn.execute(VERSION_TABLE)
+    conn.commit()
+
+
+def current_version() -> int:
+    conn = get_connection()
+    _ensure_version_table(conn)
+    row = conn.execute("SELECT MAX(version) AS version FROM schema_migrations").fetchone()
+    return int(row["version"] or 0) if row else 0
+
+
+def applied_migrations() -> list[dict[str, object]]:
+    conn = get_connection()
+    _ensure_version_table(conn)
+    rows = conn.execute("SELECT * FROM schema_migrations ORDER BY version").fetchall()
+    return rows_to_dicts(rows)
+
+
+def pending_migrations() -> list[Migration]:
+    version = current_version()
+    return [migration for migration in MIGRATIONS if migration.version > version]
+
+
+def apply_migrations(target: int | None = None) -> list[int]:
+    # Apply pending migrations in order, each in its own write transaction.
+    conn = get_connection()
+    _ensure_version_table(conn)
+    applied: list[int] = []
+    for migration in sorted(MIGRATIONS, key=lambda item: item.version):
+        if target is not None and migration.version > target:
+            break
+        begin_immediate(conn)
+        try:
+            # Re-check under the write lock: another worker may have won.
+            done = conn.execute(
+                "SELECT 1 FROM schema_migrations WHERE version = ?",
+                (migration.version,),
+            ).fetchone()
+            if done is not None:
+                conn.rollback()
+                continue
+            for step in migration.steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (?, ?)",
+                (migration.version, migration.description),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(migration.version)
+    if applied:
+        conn.execute("PRAGMA optimize")
+    return applied
@@ -2,49 +2,85 @@
 
 from __future__ import annotations
 
-from datetime import datetime
+import base64
+import binascii
+import heapq
+import json
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Iterator
 
-from .db import get_connection, row_to_dict, rows_to_dicts
+from .allocator import allocator
+from .db import begin_immediate, get_connection, row_to_dict, rows_to_dicts
 
+# Text format SQLite's CURRENT_TIMESTAMP writes into parked_at.
+SQL_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+STATUSES = ("active", "released")
 
-def create_reservation(user_id: int, lot_id: int, vehicle_number: str) -> dict[str, object] | None:
-    with get_connection() as conn:
-        spot = conn.execute(
-            "SELECT id FROM parking_spots WHERE lot_id = ? AND status = 'A' ORDER BY id LIMIT 1",
-            (lot_id,),
-        ).fetchone()
-        if spot is None:
-            return None
-        spot_id = spot["id"]
-        conn.execute("UPDATE parking_spots SET status = 'O' WHERE id = ?", (spot_id,))
-        cursor = conn.execute(
+
+def _with_lot_label(row: dict[str, object]) -> dict[str, object]:
+    row["lot"] = row.pop("lot_name", None)
+    return row
+
+
+def create_reservations(
+    user_id: int,
+    lot_id: int,
+    vehicle_number: str,
+    quantity: int = 1,
+    *,
+    partial: bool = True,
+) -> list[dict[str, object]]:
+    # Book up to ``quantity`` spots atomically; with ``partial=False`` either
+    # every spot is booked or none is.
+    conn = get_connection()
+    begin_immediate(conn)
+    spot_ids: list[int] = []
+    try:
+        spot_ids = allocator.claim(conn, lot_id, quantity)
+        if not spot_ids or (len(spot_ids) < quantity and not partial):
+            conn.rollback()
+            allocator.restore(lot_id, spot_ids)
+            return []
+        conn.executemany(
             "INSERT INTO reservations (spot_id, user_id, vehicle_number) VALUES (?, ?, ?)",
-            (spot_id, user_id, vehicle_number),
+            [(spot_id, user_id, vehicle_number) for spot_id in spot_ids],
         )
-        conn.commit()
-        reservation_id = cursor.lastrowid
-        row = conn.execute(
-            """
+        placeholders = ", ".join("?" for _ in spot_ids)
+        rows = conn.execute(
+            f"""
             SELECT r.id, r.spot_id, r.user_id, r.vehicle_number, r.parked_at, r.left_at, r.cost,
                    l.name AS lot_name, l.id AS lot_id
             FROM reservations AS r
             JOIN parking_spots AS s ON s.id = r.spot_id
             JOIN parking_lots AS l ON l.id = s.lot_id
-            WHERE r.id = ?
+            WHERE r.spot_id IN ({placeholders}) AND r.left_at IS NULL
+            ORDER BY r.id
             """,
-            (reservation_id,),
-        ).fetchone()
-    data = row_to_dict(row) or {}
-    data["lot"] = data.pop("lot_name", None)
-    return data
+            spot_ids,
+        ).fetchall()
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        allocator.restore(lot_id, spot_ids)
+        raise
+    return [_with_lot_label(row) for row in rows_to_dicts(rows)]
+
+
+def create_reservation(user_id: int, lot_id: int, vehicle_number: str) -> dict[str, object] | None:
+    records = create_reservations(user_id, lot_id, vehicle_number, 1)
+    return records[0] if records else None
 
 
 def release_reservation(reservation_id: int, user_id: int) -> dict[str, object] | None:
     with get_connection() as conn:
+        begin_immediate(conn)
         row = conn.execute(
             """
             SELECT r.id, r.spot_id, r.user_id, r.vehicle_number, r.parked_at, r.left_at, r.cost,
-                   l.price_per_hour, l.name AS lot_name
+                   l.price_per_hour, l.name AS lot_name, l.id AS lot_id
             FROM reservations AS r
             JOIN parking_spots AS s ON s.id = r.spot_id
             JOIN parking_lots AS l ON l.id = s.lot_id
@@ -66,10 +102,11 @@ def release_reservation(reservation_id: int, user_id: int) -> dict[str, object]
         )
         conn.execute("UPDATE parking_spots SET status = 'A' WHERE id = ?", (row["spot_id"],))
         conn.commit()
+        allocator.release(int(row["lot_id"]), int(row["spot_id"]))
         updated = conn.execute(
             """
             SELECT r.id, r.spot_id, r.user_id, r.vehicle_number, r.parked_at, r.left_at, r.cost,
-                   l.name AS lot_name
+                   l.name AS lot_name, l.id AS lot_id
             FROM reservations AS r
             JOIN parking_spots AS s ON s.id = r.spot_id
             JOIN parking_lots AS l ON l.id = s.lot_id
@@ -77,48 +114,357 @@ def release_reservation(reservation_id: int, user_id: int) -> dict[str, object]
             """,
             (reservation_id,),
         ).fetchone()
-    data = row_to_dict(updated) or {}
-    data["lot"] = data.pop("lot_name", None)
-    return data
+    return _with_lot_label(row_to_dict(updated) or {})
+
+
+def encode_cursor(parked_at: object, reservation_id: object) -> str:
+    raw = json.dumps([parked_at, reservation_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> tuple[str, int]:
+    # Inverse of encode_cursor; ValueError for anything malformed.
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        parked_at, reservation_id = json.loads(raw)
+        return str(parked_at), int(reservation_id)
+    except (TypeError, ValueError, binascii.Error) as exc:
+        raise ValueError("invalid cursor") from exc
 
 
-def list_user_reservations(user_id: int) -> list[dict[str, object]]:
+def timestamp_bound(value: object, *, end: bool = False) -> str | None:
+    # Normalise an ISO date/datetime to parked_at's text format. A bare date
+    # as the end bound covers that whole day.
+    if value in (None, ""):
+        return None
+    text = str(value)
+    parsed = datetime.fromisoformat(text)
+    if end and len(text) == 10:
+        parsed += timedelta(days=1)
+    return parsed.strftime(SQL_TIMESTAMP_FORMAT)
+
+
+Source = tuple[str, list[str], list[object]]
+
+
+def _page(sources: list[Source], cursor: str | None, limit: int) -> tuple[list[dict[str, object]], str | None]:
+    # Keyset pagination on (parked_at, id), newest first. Each source (hot
+    # table, archive) is read as its own index range scan and the results
+    # merged; one extra row tells whether another page exists.
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    after = decode_cursor(cursor) if cursor else None
+    results = []
     with get_connection() as conn:
-        rows = conn.execute(
+        for select, clauses, params in sources:
+            if after is not None:
+                clauses = [*clauses, "(r.parked_at, r.id) < (?, ?)"]
+                params = [*params, *after]
+            where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+            rows = conn.execute(
+                f"{select} {where} ORDER BY r.parked_at DESC, r.id DESC LIMIT ?",
+                (*params, limit + 1),
+            ).fetchall()
+            results.append(rows_to_dicts(rows))
+    if len(results) == 1:
+        merged = results[0]
+    else:
+        merged = list(heapq.merge(*results, key=lambda row: (row["parked_at"], row["id"]), reverse=True))
+    page = merged[:limit]
+    next_cursor = encode_cursor(page[-1]["parked_at"], page[-1]["id"]) if len(merged) > limit else None
+    return page, next_cursor
+
+
+def _status_clause(status: str | None) -> list[str]:
+    if status == "active":
+        return ["r.left_at IS NULL"]
+    if status == "released":
+        return ["r.left_at IS NOT NULL"]
+    return []
+
+
+def list_user_reservations(
+    user_id: int,
+    *,
+    status: str | None = None,
+    cursor: str | None = None,
+    limit: int = PAGE_SIZE,
+    include_archive: bool = False,
+) -> tuple[list[dict[str, object]], str | None]:
+    clauses = ["r.user_id = ?", *_status_clause(status)]
+    sources: list[Source] = [
+        (
             """
             SELECT r.id, r.spot_id, r.user_id, r.vehicle_number, r.parked_at, r.left_at, r.cost,
                    l.name AS lot
             FROM reservations AS r
             JOIN parking_spots AS s ON s.id = r.spot_id
             JOIN parking_lots AS l ON l.id = s.lot_id
-            WHERE r.user_id = ?
-            ORDER BY r.id DESC
             """,
-            (user_id,),
-        ).fetchall()
-    return rows_to_dicts(rows)
+            clauses,
+            [user_id],
+        )
+    ]
+    if include_archive and status != "active":
+        sources.append(
+            (
+                """
+                SELECT r.id, r.spot_id, r.user_id, r.vehicle_number, r.parked_at, r.left_at, r.cost,
+                       r.lot_name AS lot
+                FROM reservations_archive AS r
+                """,
+                clauses,
+                [user_id],
+            )
+        )
+    return _page(sources, cursor, limit)
+
+
+def list_reservations(
+    *,
+    lot_id: int | None = None,
+    user_id: int | None = None,
+    username: str | None = None,
+    vehicle_number: str | None = None,
+    status: str | None = None,
+    parked_from: str | None = None,
+    parked_before: str | None = None,
+    cursor: str | None = None,
+    limit: int = PAGE_SIZE,
+    include_archive: bool = False,
+) -> tuple[list[dict[str, object]], str | None]:
+    # Admin listing across all users. Each filter maps onto an index:
+    # user -> (user_id, parked_at), vehicle -> (vehicle_number, parked_at),
+    # lot -> spot_id, dates and the unfiltered scan -> parked_at. The
+    # archive has the same indexes, with lot_id stored on the row.
+    clauses = _status_clause(status)
+    params: list[object] = []
+    if user_id is not None:
+        clauses.append("r.user_id = ?")
+        params.append(user_id)
+    if username:
+        clauses.append("r.user_id = (SELECT id FROM users WHERE username = ?)")
+        params.append(username)
+    if vehicle_number:
+        clauses.append("r.vehicle_number = ?")
+        params.append(vehicle_number)
+    if parked_from:
+        clauses.append("r.parked_at >= ?")
+        params.append(parked_from)
+    if parked_before:
+        clauses.append("r.parked_at < ?")
+        params.append(parked_before)
+    hot_clauses, archive_clauses = list(clauses), list(clauses)
+    hot_params, archive_params = list(params), list(params)
+    if lot_id is not None:
+        hot_clauses.append("r.spot_id IN (SELECT id FROM parking_spots WHERE lot_id = ?)")
+        hot_params.append(lot_id)
+        archive_clauses.append("r.lot_id = ?")
+        archive_params.append(lot_id)
+    sources: list[Source] = [
+        (
+            """
+            SELECT r.id, r.spot_id, r.user_id, r.vehicle_number, r.parked_at, r.left_at, r.cost,
+                   u.username, l.id AS lot_id, l.name AS lot_name
+            FROM reservations AS r
+            JOIN users AS u ON u.id = r.user_id
+            JOIN parking_spots AS s ON s.id = r.spot_id
+            JOIN parking_lots AS l ON l.id = s.lot_id
+            """,
+            hot_clauses,
+            hot_params,
+        )
+    ]
+    if include_archive and status != "active":
+        sources.append(
+            (
+                """
+                SELECT r.id, r.spot_id, r.user_id, r.vehicle_number, r.parked_at, r.left_at, r.cost,
+                       (SELECT username FROM users WHERE id = r.user_id) AS username, r.lot_id, r.lot_name
+                FROM reservations_archive AS r
+                """,
+                archive_clauses,
+                archive_params,
+            )
+        )
+    return _page(sources, cursor, limit)
+
+
+def _export_sources(
+    user_id: int,
+    *,
+    parked_from: str | None = None,
+    parked_before: str | None = None,
+    changed_since: datetime | None = None,
+    changed_until: datetime | None = None,
+) -> list[tuple[str, list[object]]]:
+    select = """
+        SELECT r.id, r.spot_id, l.name AS lot, r.parked_at, r.left_at, r.cost
+        FROM reservations AS r
+        JOIN parking_spots AS s ON s.id = r.spot_id
+        JOIN parking_lots AS l ON l.id = s.lot_id
+    """
+    if changed_until is not None:
+        # Delta window: rows parked or released in the whole seconds
+        # (since, until]. parked_at holds CURRENT_TIMESTAMP text while left_at
+        # holds isoformat with microseconds, so each bound is rendered in its
+        # column's format to keep index range scans.
+        second = timedelta(seconds=1)
+        since_parked = changed_since.strftime(SQL_TIMESTAMP_FORMAT) if changed_since else ""
+        since_left = (changed_since + second).isoformat() if changed_since else ""
+        sql = f"""
+            {select} WHERE r.user_id = ? AND r.parked_at > ? AND r.parked_at <= ?
+            UNION
+            {select} WHERE r.user_id = ? AND r.left_at >= ? AND r.left_at < ?
+            ORDER BY 1 DESC
+        """
+        params: list[object] = [
+            user_id, since_parked, changed_until.strftime(SQL_TIMESTAMP_FORMAT),
+            user_id, since_left, (changed_until + second).isoformat(),
+        ]
+        # UNION deduplicates through a temp b-tree anyway; delta windows are
+        # short, so one statement is fine here.
+        return [(sql, params)]
+    clauses = ["r.user_id = ?"]
+    params = [user_id]
+    if parked_from is not None:
+        clauses.append("r.parked_at >= ?")
+        params.append(parked_from)
+    if parked_before is not None:
+        clauses.append("r.parked_at < ?")
+        params.append(parked_before)
+    # Full and ranged exports cover archived history too. Each table is read
+    # in its (user_id, parked_at) index order and merged by the caller: an
+    # ORDER BY over a compound SELECT would sort the whole history first.
+    where = " AND ".join(clauses)
+    archived = """
+        SELECT r.id, r.spot_id, r.lot_name AS lot, r.parked_at, r.left_at, r.cost
+        FROM reservations_archive AS r
+    """
+    order = "ORDER BY r.parked_at DESC, r.id DESC"
+    return [(f"{select} WHERE {where} {order}", params), (f"{archived} WHERE {where} {order}", list(params))]
 
 
-def recent_activity_count(user_id: int, since_iso: str) -> int:
+def _fetch_rows(cursor: sqlite3.Cursor, batch_size: int) -> Iterator[tuple]:
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        for row in rows:
+            yield tuple(row)
+
+
+def iter_user_reservations(user_id: int, batch_size: int = 1000, **window: object) -> Iterator[tuple]:
+    # Stream a user's history with fetchmany so memory stays flat. ``window``
+    # takes the keyword filters of _export_sources (date range or delta).
+    conn = get_connection()
+    cursors = [conn.execute(sql, params) for sql, params in _export_sources(user_id, **window)]  # type: ignore[arg-type]
+    try:
+        streams = [_fetch_rows(cursor, batch_size) for cursor in cursors]
+        if len(streams) == 1:
+            yield from streams[0]
+        else:
+            # Newest first by (parked_at, id), like the paginated listings.
+            yield from heapq.merge(*streams, key=lambda row: (row[3], row[0]), reverse=True)
+    finally:
+        for cursor in cursors:
+            cursor.close()
+
+
+def count_user_reservations(user_id: int, **window: object) -> int:
+    total = 0
     with get_connection() as conn:
-        row = conn.execute(
-            "SELECT COUNT(*) AS cnt FROM reservations WHERE user_id = ? AND parked_at >= ?",
-            (user_id, since_iso),
-        ).fetchone()
-    return int(row["cnt"]) if row else 0
+        for sql, params in _export_sources(user_id, **window):  # type: ignore[arg-type]
+            row = conn.execute(f"SELECT COUNT(*) FROM ({sql})", params).fetchone()
+            total += int(row[0]) if row else 0
+    return total
 
 
-def monthly_summary(user_id: int, since_iso: str) -> list[dict[str, object]]:
+def export_watermark(user_id: int) -> tuple[str, int]:
+    # Changes whenever a reservation is added or released for the user, but
+    # not when archival merely moves rows between tables.
+    count, max_id, max_left = 0, 0, ""
     with get_connection() as conn:
-        rows = conn.execute(
-            """
-            SELECT r.id, r.spot_id, r.parked_at, r.left_at, r.cost, l.name AS lot
+        for table in ("reservations", "reservations_archive"):
+            row = conn.execute(
+                f"SELECT COUNT(*) AS cnt, MAX(id) AS max_id, MAX(left_at) AS max_left FROM {table} WHERE user_id = ?",
+                (user_id,),
+            ).fetchone()
+            if row and row["cnt"]:
+                count += int(row["cnt"])
+                max_id = max(max_id, int(row["max_id"]))
+                max_left = max(max_left, str(row["max_left"] or ""))
+    if not count:
+        return "0:0:", 0
+    return f"{max_id}:{count}:{max_left}", count
+
+
+def iter_monthly_totals(since: str, batch_size: int = 200) -> Iterator[list[dict[str, object]]]:
+    # Batches of per-user report headers (booking count, total cost and
+    # most-used lot since ``since``) computed in one grouped query. Ties for
+    # most-used lot go to the one booked most recently. Grouping by lot first
+    # keeps the planner on the parked_at range even without ANALYZE stats,
+    # instead of walking the whole user_id index to avoid a sort.
+    cursor = get_connection().execute(
+        """
+        WITH per_lot AS (
+            SELECT r.user_id, l.name AS lot, COUNT(*) AS bookings,
+                   SUM(COALESCE(r.cost, 0)) AS cost, MAX(r.parked_at) AS last_parked
             FROM reservations AS r
             JOIN parking_spots AS s ON s.id = r.spot_id
             JOIN parking_lots AS l ON l.id = s.lot_id
-            WHERE r.user_id = ? AND r.parked_at >= ?
-            ORDER BY r.parked_at DESC
-            """,
-            (user_id, since_iso),
-        ).fetchall()
-    return rows_to_dicts(rows)
+            WHERE r.parked_at >= ?
+            GROUP BY l.id, r.user_id
+        ),
+        ranked AS (
+            SELECT per_lot.*, ROW_NUMBER() OVER (
+                PARTITION BY user_id ORDER BY bookings DESC, last_parked DESC
+            ) AS position
+            FROM per_lot
+        )
+        SELECT u.id AS user_id, u.username, SUM(ranked.bookings) AS bookings,
+               SUM(ranked.cost) AS total_cost,
+               MAX(CASE WHEN ranked.position = 1 THEN ranked.lot END) AS most_used
+        FROM ranked
+        JOIN users AS u ON u.id = ranked.user_id
+        WHERE u.role = 'user'
+        GROUP BY u.id
+        ORDER BY u.id
+        """,
+        (since,),
+    )
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows_to_dicts(rows)
+    finally:
+        cursor.close()
+
+
+def iter_monthly_details(user_ids: list[int], since: str) -> Iterator[tuple]:
+    # Stream (user_id, id, lot, parked_at, left_at, cost) for a chunk of
+    # users, grouped by user and newest first within each user.
+    if not user_ids:
+        return
+    placeholders = ", ".join("?" for _ in user_ids)
+    cursor = get_connection().execute(
+        f"""
+        SELECT r.user_id, r.id, l.name AS lot, r.parked_at, r.left_at, r.cost
+        FROM reservations AS r
+        JOIN parking_spots AS s ON s.id = r.spot_id
+        JOIN parking_lots AS l ON l.id = s.lot_id
+        WHERE r.user_id IN ({placeholders}) AND r.parked_at >= ?
+        ORDER BY r.user_id, r.parked_at DESC, r.id DESC
+        """,
+        (*user_ids, since),
+    )
+    try:
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            for row in rows:
+                yield tuple(row)
+    finally:
+        cursor.close()
@@ -0,0 +1,170 @@
+"""Hourly and daily lot usage rollups built from closed reservations."""
+
+from __future__ import annotations
+
+import sqlite3
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import DefaultDict, Dict, Iterator, List, Optional, Tuple
+
+from .db import begin_immediate, get_connection, rows_to_dicts
+
+ROLLUP_NAME = "lot_usage"
+# granularity -> (table, bucket format, minutes per bucket)
+GRANULARITIES = {
+    "hour": ("lot_usage_hourly", "%Y-%m-%d %H:00:00", 60),
+    "day": ("lot_usage_daily", "%Y-%m-%d", 1440),
+}
+
+Buckets = DefaultDict[Tuple[int, str], List[float]]
+
+
+def _split_hours(start: datetime, end: datetime) -> Iterator[Tuple[datetime, float]]:
+    # Yield (hour, minutes) pieces of the stay [start, end).
+    cursor = start
+    while cursor < end:
+        hour = cursor.replace(minute=0, second=0, microsecond=0)
+        boundary = min(hour + timedelta(hours=1), end)
+        yield hour, (boundary - cursor).total_seconds() / 60
+        cursor = boundary
+
+
+def _accumulate(rows: List[sqlite3.Row]) -> Dict[str, Buckets]:
+    # Occupied minutes are spread over the hours of the stay, a booking
+    # counts where it started and revenue where it was charged (release).
+    buckets: Dict[str, Buckets] = {name: defaultdict(lambda: [0.0, 0, 0.0]) for name in GRANULARITIES}
+
+    def add(lot_id: int, moment: datetime, field: int, amount: float) -> None:
+        for name, (_, fmt, _) in GRANULARITIES.items():
+            buckets[name][(lot_id, moment.strftime(fmt))][field] += amount
+
+    for row in rows:
+        lot_id = int(row["lot_id"])
+        parked_at = datetime.fromisoformat(str(row["parked_at"]))
+        left_at = datetime.fromisoformat(str(row["left_at"]))
+        for hour, minutes in _split_hours(parked_at, left_at):
+            add(lot_id, hour, 0, minutes)
+        add(lot_id, parked_at, 1, 1)
+        add(lot_id, left_at, 2, float(row["cost"] or 0))
+    return buckets
+
+
+def _apply(conn: sqlite3.Connection, buckets: Dict[str, Buckets]) -> None:
+    for name, values in buckets.items():
+        table = GRANULARITIES[name][0]
+        conn.executemany(
+            f"""
+            INSERT INTO {table} (lot_id, bucket, occupied_minutes, bookings, revenue)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (lot_id, bucket) DO UPDATE SET
+                occupied_minutes = occupied_minutes + excluded.occupied_minutes,
+                bookings = bookings + excluded.bookings,
+                revenue = revenue + excluded.revenue
+            """,
+            [
+                (lot_id, bucket, minutes, int(bookings), revenue)
+                for (lot_id, bucket), (minutes, bookings, revenue) in values.items()
+            ],
+        )
+
+
+def refresh(batch_size: int = 5000, lag_seconds: int = 60) -> int:
+    # Fold reservations closed since the stored watermark into the rollups
+    # and return how many were processed. Each batch and its watermark move
+    # commit together, so reruns and concurrent workers never double count.
+    # Releases younger than ``lag_seconds`` wait for the next run in case
+    # their transaction has not committed yet.
+    conn = get_connection()
+    until = (datetime.utcnow() - timedelta(seconds=lag_seconds)).isoformat()
+    processed = 0
+    while True:
+        begin_immediate(conn)
+        try:
+            state = conn.execute(
+                "SELECT last_left_at, last_id FROM rollup_state WHERE name = ?",
+                (ROLLUP_NAME,),
+            ).fetchone()
+            last_left_at, last_id = (state["last_left_at"], state["last_id"]) if state else ("", 0)
+            rows = conn.execute(
+                """
+                SELECT r.id, r.parked_at, r.left_at, r.cost, s.lot_id
+                FROM reservations AS r
+                JOIN parking_spots AS s ON s.id = r.spot_id
+                WHERE r.left_at IS NOT NULL AND (r.left_at, r.id) > (?, ?) AND r.left_at <= ?
+                ORDER BY r.left_at, r.id
+                LIMIT ?
+                """,
+                (last_left_at, last_id, until, batch_size),
+            ).fetchall()
+            if not rows:
+                conn.rollback()
+                break
+            _apply(conn, _accumulate(rows))
+            conn.execute(
+                """
+                INSERT INTO rollup_state (name, last_left_at, last_id) VALUES (?, ?, ?)
+                ON CONFLICT (name) DO UPDATE SET
+                    last_left_at = excluded.last_left_at,
+                    last_id = excluded.last_id,
+                    updated_at = CURRENT_TIMESTAMP
+                """,
+                (ROLLUP_NAME, rows[-1]["left_at"], rows[-1]["id"]),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        processed += len(rows)
+        if len(rows) < batch_size:
+            break
+    return processed
+
+
+def usage_series(
+    granularity: str,
+    start: datetime,
+    end: datetime,
+    lot_id: Optional[int] = None,
+) -> List[Dict[str, object]]:
+    # Buckets in [start, end) for one lot or summed over all lots, with
+    # occupancy as a share of the current spot capacity.
+    table, fmt, bucket_minutes = GRANULARITIES[granularity]
+    params: List[object] = [start.strftime(fmt), end.strftime(fmt)]
+    lot_filter = ""
+    if lot_id is not None:
+        lot_filter = "AND lot_id = ?"
+        params.append(lot_id)
+    with get_connection() as conn:
+        rows = conn.execute(
+            f"""
+            SELECT bucket, SUM(occupied_minutes) AS occupied_minutes,
+                   SUM(bookings) AS bookings, SUM(revenue) AS revenue
+            FROM {table}
+            WHERE bucket >= ? AND bucket < ? {lot_filter}
+            GROUP BY bucket
+            ORDER BY bucket
+            """,
+            params,
+        ).fetchall()
+        if lot_id is None:
+            capacity_row = conn.execute("SELECT COALESCE(SUM(total_spots), 0) FROM parking_lots").fetchone()
+        else:
+            capacity_row = conn.execute("SELECT total_spots FROM parking_lots WHERE id = ?", (lot_id,)).fetchone()
+    capacity = int(capacity_row[0] or 0) if capacity_row else 0
+    series = rows_to_dicts(rows)
+    for point in series:
+        point["occupied_minutes"] = round(float(point["occupied_minutes"] or 0), 2)
+        point["revenue"] = round(float(point["revenue"] or 0), 2)
+        point["occupancy"] = (
+            round(point["occupied_minutes"] / (capacity * bucket_minutes), 4) if capacity else None
+        )
+    return series
+
+
+def watermark() -> Optional[Dict[str, object]]:
+    with get_connection() as conn:
+        row = conn.execute(
+            "SELECT last_left_at, last_id, updated_at FROM rollup_state WHERE name = ?",
+            (ROLLUP_NAME,),
+        ).fetchone()
+    return dict(row) if row else None
@@ -0,0 +1,93 @@
+"""Run history for background jobs: timing and row counts."""
+
+from __future__ import annotations
+
+from typing import Optional
+
+from .db import get_connection, rows_to_dicts
+
+
+def start_run(task: str) -> int:
+    with get_connection() as conn:
+        cursor = conn.execute("INSERT INTO task_runs (task, status) VALUES (?, 'running')", (task,))
+        conn.commit()
+    return int(cursor.lastrowid)
+
+
+def mark_dispatched(run_id: int, rows_read: int) -> None:
+    # The run's work has been handed to subtasks; ``rows_read`` is the
+    # number of items they will report back through add_rows_written().
+    with get_connection() as conn:
+        conn.execute(
+            "UPDATE task_runs SET status = 'dispatched', rows_read = ? WHERE id = ? AND status = 'running'",
+            (rows_read, run_id),
+        )
+        conn.commit()
+
+
+def add_rows_written(run_id: int, count: int) -> None:
+    with get_connection() as conn:
+        conn.execute("UPDATE task_runs SET rows_written = rows_written + ? WHERE id = ?", (count, run_id))
+        conn.commit()
+
+
+def complete_if_done(run_id: int, duration_ms: float) -> bool:
+    # Close a dispatched run once its subtasks have reported every item.
+    # A single UPDATE, so exactly one caller wins.
+    with get_connection() as conn:
+        cursor = conn.execute(
+            """
+            UPDATE task_runs
+            SET status = 'completed', finished_at = CURRENT_TIMESTAMP, duration_ms = ?
+            WHERE id = ? AND status = 'dispatched' AND rows_written >= rows_read
+            """,
+            (round(duration_ms, 3), run_id),
+        )
+        conn.commit()
+    return cursor.rowcount == 1
+
+
+def fail_run(run_id: int, duration_ms: float, detail: str) -> None:
+    with get_connection() as conn:
+        conn.execute(
+            """
+            UPDATE task_runs
+            SET status = 'failed', finished_at = CURRENT_TIMESTAMP, duration_ms = ?, detail = ?
+            WHERE id = ? AND status != 'failed'
+            """,
+            (round(duration_ms, 3), detail, run_id),
+        )
+        conn.commit()
+
+
+def finish_run(
+    run_id: int,
+    status: str,
+    duration_ms: float,
+    rows_read: int,
+    rows_written: int,
+    detail: Optional[str] = None,
+) -> None:
+    with get_connection() as conn:
+        conn.execute(
+            """
+            UPDATE task_runs
+            SET status = ?, finished_at = CURRENT_TIMESTAMP, duration_ms = ?,
+                rows_read = ?, rows_written = ?, detail = ?
+            WHERE id = ?
+            """,
+            (status, round(duration_ms, 3), rows_read, rows_written, detail, run_id),
+        )
+        conn.commit()
+
+
+def recent_runs(task: Optional[str] = None, limit: int = 20) -> list[dict[str, object]]:
+    with get_connection() as conn:
+        if task is None:
+            rows = conn.execute("SELECT * FROM task_runs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT * FROM task_runs WHERE task = ? ORDER BY id DESC LIMIT ?",
+                (task, limit),
+            ).fetchall()
+    return rows_to_dicts(rows)
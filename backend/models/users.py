@@ -3,7 +3,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Optional
+from typing import Iterator, Optional
 
 import sqlite3
 
@@ -26,7 +26,10 @@ class AuthUser(UserMixin):
 
 def get_user_by_id(user_id: int) -> Optional[AuthUser]:
     with get_connection() as conn:
-        row = conn.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
+        row = conn.execute(
+            "SELECT id, username, role, email FROM users WHERE id = ?",
+            (user_id,),
+        ).fetchone()
     if row:
         return AuthUser(
             id=row["id"],
@@ -79,7 +82,28 @@ def list_non_admin_users() -> list[dict[str, object]]:
     return rows_to_dicts(rows)
 
 
-def list_all_users() -> list[dict[str, object]]:
-    with get_connection() as conn:
-        rows = conn.execute("SELECT * FROM users ORDER BY id").fetchall()
-    return rows_to_dicts(rows)
+def iter_inactive_users(since: str, batch_size: int = 1000) -> Iterator[list[tuple[int, str]]]:
+    # Batches of (id, username) for users with no booking parked at or after
+    # ``since`` (parked_at text format). The anti-join probes
+    # idx_reservations_user_parked once per user instead of a query each.
+    cursor = get_connection().execute(
+        """
+        SELECT u.id, u.username
+        FROM users AS u
+        WHERE u.role = 'user'
+          AND NOT EXISTS (
+              SELECT 1 FROM reservations AS r
+              WHERE r.user_id = u.id AND r.parked_at >= ?
+          )
+        ORDER BY u.id
+        """,
+        (since,),
+    )
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [(int(row[0]), str(row[1])) for row in rows]
+    finally:
+        cursor.close()
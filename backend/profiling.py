@@ -0,0 +1,231 @@
+"""Opt-in cProfile sampling for requests and Celery tasks."""
+
+from __future__ import annotations
+
+import cProfile
+import functools
+import logging
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from flask import Flask, Response, current_app, g, has_app_context, request
+from flask_login import current_user
+
+logger = logging.getLogger(__name__)
+
+SUFFIX = ".pstats"
+SORT_KEYS = ("cumulative", "tottime", "calls")
+# File names carry the metadata: <epoch ms>_<kind>_<target>_<duration us>.pstats
+_NAME = re.compile(r"^(\d+)_(request|task)_([\w.-]+)_(\d+)\.pstats$")
+
+# cProfile hooks the interpreter's profiler slot, so one profile runs at a
+# time per process; work that arrives while it is busy is not sampled.
+_busy = threading.Lock()
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^\w.-]+", "-", text).strip("-")[:80] or "root"
+
+
+def _start() -> Optional[cProfile.Profile]:
+    if not _busy.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except BaseException:
+        _busy.release()
+        raise
+    return profiler
+
+
+def _stop(profiler: cProfile.Profile) -> None:
+    try:
+        profiler.disable()
+    finally:
+        _busy.release()
+
+
+def _save(profiler: cProfile.Profile, directory: Path, max_files: int, kind: str, target: str, seconds: float) -> str:
+    # Dump atomically, then drop the oldest files beyond ``max_files``.
+    directory.mkdir(parents=True, exist_ok=True)
+    name = f"{int(time.time() * 1000)}_{kind}_{_slug(target)}_{int(seconds * 1_000_000)}{SUFFIX}"
+    partial = directory / f".{name}.part"
+    profiler.dump_stats(str(partial))
+    os.replace(partial, directory / name)
+    files = sorted(path for path in directory.glob(f"*{SUFFIX}") if _NAME.match(path.name))
+    for stale in files[: max(0, len(files) - max_files)]:
+        stale.unlink(missing_ok=True)
+    return name
+
+
+def _directory(config: Any) -> Path:
+    return Path(config["PROFILE_DIR"])
+
+
+def _record(profiler: cProfile.Profile, kind: str, target: str, seconds: float) -> Optional[str]:
+    config = current_app.config
+    try:
+        return _save(profiler, _directory(config), int(config["PROFILE_MAX_FILES"]), kind, target, seconds)
+    except OSError:
+        logger.exception("could not write %s profile for %s", kind, target)
+        return None
+
+
+def _wants_request_profile() -> bool:
+    config = current_app.config
+    header = config["PROFILE_HEADER"]
+    if header and request.headers.get(header):
+        # Forcing a profile is an admin-only debugging aid.
+        return bool(current_user.is_authenticated and getattr(current_user, "role", None) == "admin")
+    rate = float(config["PROFILE_SAMPLE_RATE"])
+    return rate > 0 and random.random() < rate
+
+
+def _before_request() -> None:
+    if not _wants_request_profile():
+        return
+    profiler = _start()
+    if profiler is not None:
+        g._profiler = profiler
+        g._profile_started = time.perf_counter()
+
+
+def _after_request(response: Response) -> Response:
+    profiler = g.pop("_profiler", None)
+    if profiler is None:
+        return response
+    _stop(profiler)
+    elapsed = time.perf_counter() - g._profile_started
+    rule = request.url_rule
+    name = _record(profiler, "request", f"{request.method} {rule.rule if rule else 'unmatched'}", elapsed)
+    if name:
+        response.headers["X-Profile-Id"] = name
+    return response
+
+
+def _teardown_request(exc: Optional[BaseException]) -> None:
+    # The view raised before after_request ran; drop the partial profile.
+    profiler = g.pop("_profiler", None)
+    if profiler is not None:
+        _stop(profiler)
+
+
+def profile_task(name: str, func: Callable[..., Any]) -> Callable[..., Any]:
+    # Wrap a task body so a sampled fraction of runs (or every run of the
+    # tasks listed in PROFILE_TASKS) is profiled. Tasks run inside an app
+    # context, which is where the configuration is read from.
+    short_name = name.rsplit(".", 1)[-1]
+
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if not has_app_context() or not current_app.config.get("PROFILE_ENABLED"):
+            return func(*args, **kwargs)
+        config = current_app.config
+        rate = float(config["PROFILE_TASK_SAMPLE_RATE"])
+        if short_name not in config["PROFILE_TASKS"] and not (rate > 0 and random.random() < rate):
+            return func(*args, **kwargs)
+        profiler = _start()
+        if profiler is None:
+            return func(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _stop(profiler)
+            _record(profiler, "task", short_name, time.perf_counter() - started)
+
+    return wrapper
+
+
+def list_profiles(
+    directory: Path,
+    *,
+    kind: Optional[str] = None,
+    target: Optional[str] = None,
+    limit: int = 50,
+) -> List[Dict[str, object]]:
+    # Newest first; ``target`` matches the slugged route or task name.
+    entries = []
+    for path in sorted(directory.glob(f"*{SUFFIX}"), reverse=True):
+        match = _NAME.match(path.name)
+        if match is None:
+            continue
+        created, entry_kind, entry_target, duration = match.groups()
+        if kind and entry_kind != kind:
+            continue
+        if target and _slug(target) != entry_target:
+            continue
+        entries.append(
+            {
+                "id": path.name,
+                "kind": entry_kind,
+                "target": entry_target,
+                "duration_ms": round(int(duration) / 1000, 3),
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(int(created) / 1000)),
+                "size": path.stat().st_size,
+            }
+        )
+        if len(entries) >= limit:
+            break
+    return entries
+
+
+def _location(filename: str, line: int, function: str) -> str:
+    if filename == "~":
+        return function
+    parts = Path(filename).parts
+    return f"{'/'.join(parts[-3:])}:{line}({function})"
+
+
+def top_functions(directory: Path, ids: Iterable[str], sort: str = "cumulative", top: int = 25) -> Dict[str, object]:
+    # Merge the given profiles and return the heaviest functions.
+    paths = [directory / name for name in ids if _NAME.match(name) and (directory / name).is_file()]
+    if not paths:
+        return {"profiles": 0, "functions": []}
+    stats = pstats.Stats(str(paths[0]))
+    for path in paths[1:]:
+        stats.add(str(path))
+    field = {"cumulative": 3, "tottime": 2, "calls": 1}[sort]
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][field], reverse=True)[:top]  # type: ignore[attr-defined]
+    return {
+        "profiles": len(paths),
+        "total_ms": round(stats.total_tt * 1000, 3),  # type: ignore[attr-defined]
+        "sort": sort,
+        "functions": [
+            {
+                "function": _location(*func),
+                "calls": calls,
+                "primitive_calls": primitive,
+                "tottime_ms": round(tottime * 1000, 3),
+                "cumtime_ms": round(cumtime * 1000, 3),
+            }
+            for func, (primitive, calls, tottime, cumtime, _) in rows
+        ],
+    }
+
+
+def profile_dir() -> Path:
+    return _directory(current_app.config)
+
+
+def init_app(app: Flask) -> None:
+    app.config.setdefault("PROFILE_ENABLED", False)
+    # Fraction of requests profiled; admins can force one with the header.
+    app.config.setdefault("PROFILE_SAMPLE_RATE", 0.0)
+    app.config.setdefault("PROFILE_HEADER", "X-Profile")
+    app.config.setdefault("PROFILE_TASK_SAMPLE_RATE", 0.0)
+    app.config.setdefault("PROFILE_TASKS", ())
+    app.config.setdefault("PROFILE_DIR", "profiles")
+    app.config.setdefault("PROFILE_MAX_FILES", 200)
+    if not app.config["PROFILE_ENABLED"]:
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
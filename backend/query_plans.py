@@ -0,0 +1,291 @@
+"""Named model queries and an EXPLAIN QUERY PLAN regression check.
+
+Each entry runs the real model function, so the SQL checked is whatever
+``lots.py``, ``reservations.py`` and friends execute today. Statements are
+captured through the query observer and explained with NULL bindings; a
+full ``SCAN`` of a large table fails the check unless the entry allows it.
+"""
+
+from __future__ import annotations
+
+import re
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .models import archive, db, export_jobs, lots, reservations, rollups, task_runs, users
+
+# Tables that grow with traffic; a full scan of one of these is a regression.
+LARGE_TABLES = frozenset(
+    {
+        "users",
+        "parking_spots",
+        "reservations",
+        "reservations_archive",
+        "export_jobs",
+        "task_runs",
+        "lot_usage_hourly",
+        "lot_usage_daily",
+    }
+)
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+_ALIAS = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)\s+AS\s+(\w+)", re.IGNORECASE)
+_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+
+
+@dataclass(frozen=True)
+class Sample:
+    """Representative ids and bounds picked from the database being checked."""
+
+    user_id: int
+    username: str
+    lot_id: int
+    vehicle_number: str
+    since: str
+    now: datetime
+
+
+@dataclass(frozen=True)
+class NamedQuery:
+    name: str
+    run: Callable[[Sample], Any]
+    # Large tables this query is expected to read in full (with the reason).
+    allow_scans: Tuple[str, ...] = ()
+    reason: str = ""
+    # Probes that change data only run against scratch databases.
+    writes: bool = False
+
+
+def _drain(iterable: Iterable[Any]) -> int:
+    return sum(1 for _ in iterable)
+
+
+def _book_and_release(sample: Sample) -> None:
+    records = reservations.create_reservations(sample.user_id, sample.lot_id, sample.vehicle_number, 1)
+    for record in records:
+        reservations.release_reservation(int(record["id"]), sample.user_id)
+
+
+QUERIES: List[NamedQuery] = [
+    NamedQuery("lots.list_all_lots", lambda s: lots.list_all_lots(include_available=True)),
+    NamedQuery("lots.list_lot_ids", lambda s: lots.list_lot_ids()),
+    NamedQuery("lots.get_lots", lambda s: lots.get_lots([s.lot_id])),
+    NamedQuery("lots.available_spots", lambda s: lots.available_spots(s.lot_id)),
+    NamedQuery("lots.admin_dashboard_stats", lambda s: lots.admin_dashboard_stats()),
+    NamedQuery("lots.has_available_lots", lambda s: lots.has_available_lots()),
+    NamedQuery("lots.list_available_lots", lambda s: lots.list_available_lots()),
+    NamedQuery("users.get_user_by_id", lambda s: users.get_user_by_id(s.user_id)),
+    NamedQuery("users.get_user_by_username", lambda s: users.get_user_by_username(s.username)),
+    NamedQuery(
+        "users.list_non_admin_users",
+        lambda s: users.list_non_admin_users(),
+        allow_scans=("users",),
+        reason="admin listing returns every user",
+    ),
+    NamedQuery(
+        "users.iter_inactive_users",
+        lambda s: _drain(users.iter_inactive_users(s.since)),
+        allow_scans=("users",),
+        reason="reminders visit every user once; reservations are probed by index",
+    ),
+    NamedQuery(
+        "reservations.list_user_reservations",
+        lambda s: reservations.list_user_reservations(s.user_id, include_archive=True),
+    ),
+    NamedQuery(
+        "reservations.list_user_reservations.active",
+        lambda s: reservations.list_user_reservations(s.user_id, status="active"),
+    ),
+    NamedQuery(
+        "reservations.list_reservations",
+        lambda s: reservations.list_reservations(include_archive=True),
+        allow_scans=("reservations", "reservations_archive"),
+        reason="unfiltered newest-first page walks idx_*_parked and stops at the limit",
+    ),
+    NamedQuery(
+        "reservations.list_reservations.lot",
+        lambda s: reservations.list_reservations(lot_id=s.lot_id, include_archive=True),
+    ),
+    NamedQuery(
+        "reservations.list_reservations.username",
+        lambda s: reservations.list_reservations(username=s.username, include_archive=True),
+    ),
+    NamedQuery(
+        "reservations.list_reservations.vehicle",
+        lambda s: reservations.list_reservations(vehicle_number=s.vehicle_number, include_archive=True),
+    ),
+    NamedQuery(
+        "reservations.list_reservations.dates",
+        lambda s: reservations.list_reservations(parked_from=s.since, include_archive=True),
+    ),
+    NamedQuery(
+        "reservations.iter_user_reservations",
+        lambda s: _drain(reservations.iter_user_reservations(s.user_id)),
+    ),
+    NamedQuery(
+        "reservations.iter_user_reservations.delta",
+        lambda s: _drain(
+            reservations.iter_user_reservations(
+                s.user_id, changed_since=s.now - timedelta(days=1), changed_until=s.now
+            )
+        ),
+    ),
+    NamedQuery("reservations.count_user_reservations", lambda s: reservations.count_user_reservations(s.user_id)),
+    NamedQuery("reservations.export_watermark", lambda s: reservations.export_watermark(s.user_id)),
+    NamedQuery("reservations.iter_monthly_totals", lambda s: _drain(reservations.iter_monthly_totals(s.since))),
+    NamedQuery(
+        "reservations.iter_monthly_details",
+        lambda s: _drain(reservations.iter_monthly_details([s.user_id], s.since)),
+    ),
+    NamedQuery("export_jobs.last_delivered_until", lambda s: export_jobs.last_delivered_until(s.user_id)),
+    NamedQuery("export_jobs.list_jobs_for_user", lambda s: export_jobs.list_jobs_for_user(s.user_id)),
+    NamedQuery(
+        "task_runs.recent_runs",
+        lambda s: task_runs.recent_runs(),
+        allow_scans=("task_runs",),
+        reason="reads the rowid b-tree backwards and stops at the limit",
+    ),
+    NamedQuery("task_runs.recent_runs.task", lambda s: task_runs.recent_runs("send_monthly_reports")),
+    NamedQuery(
+        "rollups.usage_series",
+        lambda s: rollups.usage_series("hour", s.now - timedelta(days=7), s.now),
+    ),
+    NamedQuery(
+        "rollups.usage_series.lot",
+        lambda s: rollups.usage_series("day", s.now - timedelta(days=90), s.now, s.lot_id),
+    ),
+    NamedQuery(
+        "archive.archive_stats",
+        lambda s: archive.archive_stats(),
+        allow_scans=("reservations", "reservations_archive"),
+        reason="admin table sizes: COUNT(*) reads the smallest index of each table",
+    ),
+    NamedQuery("reservations.book_and_release", _book_and_release, writes=True),
+    NamedQuery("rollups.refresh", lambda s: rollups.refresh(), writes=True),
+    NamedQuery("archive.archive_closed", lambda s: archive.archive_closed(36500), writes=True),
+]
+
+
+def _sample(conn: sqlite3.Connection) -> Sample:
+    # Prefer a user and lot that actually have history so joins return rows.
+    row = conn.execute(
+        """
+        SELECT r.user_id, u.username, s.lot_id, r.vehicle_number
+        FROM reservations AS r
+        JOIN users AS u ON u.id = r.user_id
+        JOIN parking_spots AS s ON s.id = r.spot_id
+        ORDER BY r.id DESC
+        LIMIT 1
+        """
+    ).fetchone()
+    now = datetime.utcnow().replace(microsecond=0)
+    since = (now - timedelta(days=30)).strftime(reservations.SQL_TIMESTAMP_FORMAT)
+    if row is not None:
+        return Sample(int(row[0]), str(row[1]), int(row[2]), str(row[3]), since, now)
+    lot = conn.execute("SELECT id FROM parking_lots ORDER BY id LIMIT 1").fetchone()
+    user = conn.execute("SELECT id, username FROM users ORDER BY id LIMIT 1").fetchone()
+    return Sample(
+        int(user[0]) if user else 1,
+        str(user[1]) if user else "admin",
+        int(lot[0]) if lot else 1,
+        "AB12CD3456",
+        since,
+        now,
+    )
+
+
+def _compact(sql: str) -> str:
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+def _explain(conn: sqlite3.Connection, sql: str) -> List[str]:
+    # Plans do not depend on bound values, so NULLs stand in for them.
+    placeholders = _STRING_LITERAL.sub("", sql).count("?")
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", (None,) * placeholders).fetchall()
+    return [str(row[3]) for row in rows]
+
+
+def _scanned_tables(sql: str, plan: List[str]) -> List[str]:
+    aliases = {alias.lower(): table.lower() for table, alias in _ALIAS.findall(sql)}
+    tables = []
+    for detail in plan:
+        match = _SCAN.match(detail)
+        if match is None:
+            continue
+        table = match.group(1).lower() if match.group(2) else aliases.get(match.group(1).lower(), match.group(1).lower())
+        if table in LARGE_TABLES:
+            tables.append(table)
+    return tables
+
+
+def _check(query: NamedQuery, sample: Sample, conn: sqlite3.Connection) -> Dict[str, Any]:
+    started = time.perf_counter()
+    error = None
+    with db.capture_queries() as captured:
+        try:
+            query.run(sample)
+        except Exception as exc:  # reported, not raised: one bad query should not hide the rest
+            error = f"{type(exc).__name__}: {exc}"
+    elapsed = time.perf_counter() - started
+
+    statements = []
+    problems: List[str] = []
+    notes: List[str] = []
+    allowed: List[str] = []
+    seen = set()
+    for sql, seconds in captured:
+        text = sql.strip()
+        if not text.upper().startswith(_EXPLAINABLE):
+            continue
+        compact = _compact(text)
+        if compact in seen:
+            continue
+        seen.add(compact)
+        plan = _explain(conn, text)
+        for table in _scanned_tables(text, plan):
+            if table in query.allow_scans:
+                allowed.append(table)
+            else:
+                problems.append(f"full scan of {table}: {compact[:160]}")
+        notes.extend(detail for detail in plan if detail.startswith("USE TEMP B-TREE"))
+        statements.append({"sql": compact, "ms": round(seconds * 1000, 3), "plan": plan})
+    if error:
+        problems.append(error)
+    return {
+        "name": query.name,
+        "ok": not problems,
+        "ms": round(elapsed * 1000, 3),
+        "problems": problems,
+        "notes": sorted(set(notes)),
+        "allowed_scans": sorted(set(allowed)),
+        "reason": query.reason or None,
+        "statements": statements,
+    }
+
+
+def check_plans(include_writes: bool = False, names: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    # Run every registered query (optionally a subset) and explain what it
+    # executed. Write probes are skipped unless the caller owns the database.
+    wanted = set(names) if names else None
+    conn = db.get_connection()
+    sample = _sample(conn)
+    results = []
+    skipped = []
+    for query in QUERIES:
+        if wanted is not None and query.name not in wanted:
+            continue
+        if query.writes and not include_writes:
+            skipped.append(query.name)
+            continue
+        results.append(_check(query, sample, conn))
+    return {
+        "ok": all(result["ok"] for result in results),
+        "sqlite_version": sqlite3.sqlite_version,
+        "checked": len(results),
+        "failed": [result["name"] for result in results if not result["ok"]],
+        "skipped": skipped,
+        "queries": results,
+    }
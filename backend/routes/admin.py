@@ -2,12 +2,16 @@
 
 from __future__ import annotations
 
-from flask import Blueprint, abort, request
+from datetime import datetime, timedelta
+
+from flask import Blueprint, abort, current_app, request
 from flask_login import current_user, login_required
 
-from .. import cache_keys
+from .. import http_cache, lot_cache, lot_events, profiling, query_plans
 from ..extensions import cache
-from ..models.lots import admin_dashboard_stats, create_lot, delete_lot, list_all_lots, update_lot
+from ..models import archive, db, rollups, task_runs
+from ..models.lots import create_lot, delete_lot, update_lot
+from ..models.reservations import STATUSES, list_reservations, timestamp_bound
 from ..models.users import list_non_admin_users
 
 bp = Blueprint("admin", __name__, url_prefix="/api/admin")
@@ -18,21 +22,17 @@ def require_admin() -> None:
         abort(403, description="admin only")
 
 
-def _bust_cache(*keys: str) -> None:
-    for key in keys:
-        cache.delete(key)
+def _bust_cache(*lot_ids: int, membership: bool = False) -> None:
+    # Invalidate only the touched lots; list views rebuild from the rest.
+    lot_cache.invalidate(*lot_ids, membership=membership)
+    lot_events.publish_lots(*lot_ids)
 
 
 @bp.get("/lots")
 @login_required
 def lots_index():
     require_admin()
-    cached = cache.get(cache_keys.ADMIN_LOTS_CACHE_KEY)
-    if cached is not None:
-        return {"lots": cached}
-    lots = list_all_lots(include_available=True)
-    cache.set(cache_keys.ADMIN_LOTS_CACHE_KEY, lots, timeout=300)
-    return {"lots": lots}
+    return http_cache.lot_listing("admin-lots", lot_cache.admin_lots, key="lots")
 
 
 @bp.post("/lots")
@@ -55,11 +55,7 @@ def lots_create():
         address=payload.get("address"),
         pin_code=payload.get("pin_code"),
     )
-    _bust_cache(
-        cache_keys.ADMIN_LOTS_CACHE_KEY,
-        cache_keys.ADMIN_DASHBOARD_CACHE_KEY,
-        cache_keys.USER_LOTS_CACHE_KEY,
-    )
+    _bust_cache(int(data["id"]), membership=True)
     return data, 201
 
 
@@ -80,11 +76,7 @@ def lots_update(lot_id: int):
         return {"error": "not found"}, 404
     if status == "occupied":
         return {"error": "occupied spots prevent shrink"}, 400
-    _bust_cache(
-        cache_keys.ADMIN_LOTS_CACHE_KEY,
-        cache_keys.ADMIN_DASHBOARD_CACHE_KEY,
-        cache_keys.USER_LOTS_CACHE_KEY,
-    )
+    _bust_cache(lot_id)
     return record
 
 
@@ -97,11 +89,7 @@ def lots_delete(lot_id: int):
         return {"error": "not found"}, 404
     if status == "occupied":
         return {"error": "occupied spots"}, 400
-    _bust_cache(
-        cache_keys.ADMIN_LOTS_CACHE_KEY,
-        cache_keys.ADMIN_DASHBOARD_CACHE_KEY,
-        cache_keys.USER_LOTS_CACHE_KEY,
-    )
+    _bust_cache(lot_id, membership=True)
     return {"message": "deleted"}
 
 
@@ -116,30 +104,154 @@ def list_users():
 @login_required
 def list_all_reservations():
     require_admin()
-    from ..models.db import get_connection, rows_to_dicts
-    with get_connection() as conn:
-        rows = conn.execute(
-            """
-            SELECT r.id, r.spot_id, r.vehicle_number, r.parked_at, r.left_at, r.cost,
-                   u.username, l.name AS lot_name
-            FROM reservations r
-            JOIN users u ON u.id = r.user_id
-            JOIN parking_spots s ON s.id = r.spot_id
-            JOIN parking_lots l ON l.id = s.lot_id
-            ORDER BY r.parked_at DESC
-            LIMIT 100
-            """
-        ).fetchall()
-    return {"reservations": rows_to_dicts(rows)}
+    args = request.args
+    status = args.get("status") or None
+    if status is not None and status not in STATUSES:
+        return {"error": "status must be active or released"}, 400
+    try:
+        parked_from = timestamp_bound(args.get("from"))
+        parked_before = timestamp_bound(args.get("to"), end=True)
+    except ValueError:
+        return {"error": "from/to must be ISO dates"}, 400
+    try:
+        rows, next_cursor = list_reservations(
+            lot_id=args.get("lot_id", type=int),
+            user_id=args.get("user_id", type=int),
+            username=args.get("username") or None,
+            vehicle_number=args.get("vehicle_number") or None,
+            status=status,
+            parked_from=parked_from,
+            parked_before=parked_before,
+            cursor=args.get("cursor") or None,
+            limit=args.get("limit", current_app.config["RESERVATIONS_PAGE_SIZE"], type=int),
+            include_archive=args.get("include_archive", "") in ("1", "true"),
+        )
+    except ValueError:
+        return {"error": "invalid cursor"}, 400
+    return {"reservations": rows, "next_cursor": next_cursor}
+
+
+def _usage_series(fields: tuple[str, ...]):
+    # Shared argument handling for the rollup-backed time series.
+    granularity = request.args.get("granularity", "hour")
+    if granularity not in rollups.GRANULARITIES:
+        return {"error": "granularity must be hour or day"}, 400
+    span = timedelta(hours=48) if granularity == "hour" else timedelta(days=30)
+    try:
+        end = datetime.fromisoformat(request.args["to"]) if request.args.get("to") else datetime.utcnow()
+        start = datetime.fromisoformat(request.args["from"]) if request.args.get("from") else end - span
+    except ValueError:
+        return {"error": "from/to must be ISO dates"}, 400
+    if start >= end:
+        return {"error": "from must be before to"}, 400
+    lot_id = request.args.get("lot_id", type=int)
+    series = rollups.usage_series(granularity, start, end, lot_id)
+    return {
+        "granularity": granularity,
+        "lot_id": lot_id,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "series": [{key: point[key] for key in ("bucket", *fields)} for point in series],
+        "watermark": rollups.watermark(),
+    }
+
+
+@bp.get("/stats/occupancy")
+@login_required
+def occupancy_series():
+    require_admin()
+    return _usage_series(("occupied_minutes", "occupancy", "bookings"))
+
+
+@bp.get("/stats/revenue")
+@login_required
+def revenue_series():
+    require_admin()
+    return _usage_series(("revenue", "bookings"))
+
+
+@bp.get("/db/settings")
+@login_required
+def db_settings():
+    require_admin()
+    return db.effective_pragmas()
+
+
+@bp.get("/tasks/runs")
+@login_required
+def task_run_history():
+    require_admin()
+    task = request.args.get("task") or None
+    limit = min(request.args.get("limit", 20, type=int) or 20, 200)
+    return {"runs": task_runs.recent_runs(task, limit)}
+
+
+@bp.get("/db/archive")
+@login_required
+def archive_status():
+    require_admin()
+    return archive.archive_stats()
+
+
+@bp.get("/db/plans")
+@login_required
+def query_plan_check():
+    # Explain every registered read query against the live database.
+    require_admin()
+    names = request.args.getlist("query") or None
+    return query_plans.check_plans(names=names)
+
+
+@bp.get("/profiles")
+@login_required
+def profile_index():
+    require_admin()
+    limit = min(request.args.get("limit", 50, type=int) or 50, 500)
+    return {
+        "enabled": current_app.config["PROFILE_ENABLED"],
+        "profiles": profiling.list_profiles(
+            profiling.profile_dir(),
+            kind=request.args.get("kind") or None,
+            target=request.args.get("target") or None,
+            limit=limit,
+        ),
+    }
+
+
+@bp.get("/profiles/top")
+@login_required
+def profile_top_functions():
+    # Aggregate the chosen profiles, or the latest ``limit`` matching ones.
+    require_admin()
+    sort = request.args.get("sort", "cumulative")
+    if sort not in profiling.SORT_KEYS:
+        return {"error": f"sort must be one of {', '.join(profiling.SORT_KEYS)}"}, 400
+    directory = profiling.profile_dir()
+    ids = request.args.getlist("id")
+    if not ids:
+        limit = min(request.args.get("limit", 20, type=int) or 20, 500)
+        entries = profiling.list_profiles(
+            directory,
+            kind=request.args.get("kind") or None,
+            target=request.args.get("target") or None,
+            limit=limit,
+        )
+        ids = [str(entry["id"]) for entry in entries]
+    top = min(request.args.get("top", 25, type=int) or 25, 200)
+    return profiling.top_functions(directory, ids, sort=sort, top=top)
+
+
+@bp.get("/cache/stats")
+@login_required
+def cache_stats():
+    require_admin()
+    backend = cache.cache
+    stats = getattr(backend, "stats", None)
+    return stats() if callable(stats) else {"mode": type(backend).__name__}
 
 
 @bp.get("/dashboard")
 @login_required
 def dashboard_stats():
     require_admin()
-    cached = cache.get(cache_keys.ADMIN_DASHBOARD_CACHE_KEY)
-    if cached is not None:
-        return cached
-    stats = admin_dashboard_stats()
-    cache.set(cache_keys.ADMIN_DASHBOARD_CACHE_KEY, stats, timeout=300)
-    return stats
+    return http_cache.lot_listing("dashboard", lot_cache.dashboard_stats)
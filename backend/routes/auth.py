@@ -2,18 +2,36 @@
 
 from __future__ import annotations
 
+from dataclasses import asdict
+
 from flask import Blueprint, request
 from flask_login import current_user, login_required, login_user, logout_user
 
-from ..extensions import login_manager
+from .. import cache_keys
+from ..extensions import cache, login_manager
 from ..models.users import AuthUser, create_user, get_user_by_id, verify_credentials
 
 bp = Blueprint("auth", __name__, url_prefix="/api/auth")
 
+# No route edits users today; if one does, it must delete the cached entry
+# too, otherwise role or account changes take up to this long to apply.
+AUTH_USER_TIMEOUT = 60
+
+
+def cache_user(user: AuthUser) -> None:
+    cache.set(cache_keys.auth_user_key(user.id), asdict(user), timeout=AUTH_USER_TIMEOUT)
+
 
 @login_manager.user_loader
 def load_user(user_id: str) -> AuthUser | None:
-    return get_user_by_id(int(user_id))
+    # Flask-Login memoizes this per request; the cache spans requests.
+    cached = cache.get(cache_keys.auth_user_key(int(user_id)))
+    if cached is not None:
+        return AuthUser(**cached)
+    user = get_user_by_id(int(user_id))
+    if user is not None:
+        cache_user(user)
+    return user
 
 
 @bp.post("/register")
@@ -45,6 +63,8 @@ def login():
     user = verify_credentials(username, password)
     if not user:
         return {"error": "invalid creds"}, 401
+    # A fresh login always refreshes the cached identity.
+    cache_user(user)
     login_user(user)
     return {"message": "logged"}
 
@@ -2,49 +2,89 @@
 
 from __future__ import annotations
 
-from flask import Blueprint, abort, request, send_file, url_for
+import re
+from pathlib import Path
+
+from flask import Blueprint, Response, abort, current_app, request, send_file, stream_with_context, url_for
 from flask_login import current_user, login_required
 
-from .. import cache_keys
-from ..extensions import cache
+from .. import http_cache, lot_cache, lot_events
 from ..models import export_jobs
-from ..models.lots import list_available_lots
-from ..models.reservations import create_reservation, list_user_reservations, release_reservation
+from ..models.reservations import STATUSES, export_watermark, timestamp_bound
+from ..models.reservations import create_reservations, list_user_reservations, release_reservation
 from ..tasks import enqueue_export
 
 bp = Blueprint("user", __name__, url_prefix="/api/user")
 
+# XXNNXXNNNN: 2 letters, 2 digits, 2 letters, 4 digits.
+VEHICLE_NUMBER = re.compile(r"^[A-Z]{2}\d{2}[A-Z]{2}\d{4}$")
+
 
 def require_user() -> None:
     if not current_user.is_authenticated or current_user.role != "user":
         abort(403, description="user only")
 
 
-def _bust_lot_caches() -> None:
-    # Clear cached lot data.
-    cache.delete(cache_keys.USER_LOTS_CACHE_KEY)
-    cache.delete(cache_keys.ADMIN_LOTS_CACHE_KEY)
-    cache.delete(cache_keys.ADMIN_DASHBOARD_CACHE_KEY)
+def _bust_lot_caches(lot_id: int) -> None:
+    # Clear cached data for the lot whose availability changed and tell
+    # stream subscribers its new counts.
+    lot_cache.invalidate(lot_id)
+    lot_events.publish_lots(lot_id)
 
 
 @bp.get("/lots")
 @login_required
-def lots_index() -> dict[str, object]:
+def lots_index():
+    require_user()
+    return http_cache.lot_listing("user-lots", lot_cache.user_lots, key="lots")
+
+
+@bp.get("/lots/stream")
+@login_required
+def lots_stream():
+    # Server-Sent Events: availability changes instead of polling /lots.
     require_user()
-    cached = cache.get(cache_keys.USER_LOTS_CACHE_KEY)
-    if cached is not None:
-        return {"lots": cached}
-    lots = list_available_lots()
-    cache.set(cache_keys.USER_LOTS_CACHE_KEY, lots, timeout=120)
-    return {"lots": lots}
+    try:
+        lot_ids = lot_events.parse_lot_ids(request.args.get("lots"))
+    except ValueError:
+        return {"error": "lots must be a comma-separated list of lot ids"}, 400
+    raw_cursor = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        last_event_id = int(raw_cursor) if raw_cursor else None
+    except ValueError:
+        last_event_id = None
+    response = Response(
+        stream_with_context(lot_events.stream(lot_ids, last_event_id)),
+        mimetype="text/event-stream",
+    )
+    response.headers["Cache-Control"] = "no-cache"
+    # Stop nginx from buffering the stream.
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
 
 
 @bp.get("/reservations")
 @login_required
-def reservations_index() -> dict[str, object]:
+def reservations_index():
     require_user()
-    data = list_user_reservations(current_user.id)
-    return {"reservations": data}
+    status = request.args.get("status") or None
+    if status is not None and status not in STATUSES:
+        return {"error": "status must be active or released"}, 400
+
+    def build():
+        try:
+            data, next_cursor = list_user_reservations(
+                current_user.id,
+                status=status,
+                cursor=request.args.get("cursor") or None,
+                limit=request.args.get("limit", current_app.config["RESERVATIONS_PAGE_SIZE"], type=int),
+                include_archive=request.args.get("include_archive", "") in ("1", "true"),
+            )
+        except ValueError:
+            return {"error": "invalid cursor"}, 400
+        return {"reservations": data, "next_cursor": next_cursor}
+
+    return http_cache.conditional(http_cache.reservations_tag(current_user.id), build)
 
 
 @bp.post("/reservations")
@@ -56,30 +96,35 @@ def reservations_create():
         lot_id = int(payload["lot_id"])
         quantity = int(payload.get("quantity", 1))
         vehicle_number = payload.get("vehicle_number", "").strip().upper()
+        all_or_nothing = payload.get("all_or_nothing", False)
+        if not isinstance(all_or_nothing, bool):
+            return {"error": "all_or_nothing must be true or false"}, 400
         
         if quantity < 1 or quantity > 10:
             return {"error": "quantity must be between 1 and 10"}, 400
         
-        # Validate vehicle number format: XXNNXXNNNN (2 letters, 2 digits, 2 letters, 4 digits)
-        import re
-        if not vehicle_number or not re.match(r'^[A-Z]{2}\d{2}[A-Z]{2}\d{4}$', vehicle_number):
+        if not vehicle_number or not VEHICLE_NUMBER.match(vehicle_number):
             return {"error": "vehicle number must be in format XXNNXXNNNN (e.g., AB12CD3456)"}, 400
             
     except (KeyError, TypeError, ValueError):
         return {"error": "invalid parameters"}, 400
     
-    # Create multiple reservations
-    records = []
-    for _ in range(quantity):
-        record = create_reservation(current_user.id, lot_id, vehicle_number)
-        if not record:
-            break
-        records.append(record)
+    # Book every spot in a single transaction
+    records = create_reservations(
+        current_user.id,
+        lot_id,
+        vehicle_number,
+        quantity,
+        partial=not all_or_nothing,
+    )
     
     if not records:
+        if all_or_nothing and quantity > 1:
+            return {"error": "not enough spots available"}, 400
         return {"error": "no spots available"}, 400
     
-    _bust_lot_caches()
+    _bust_lot_caches(lot_id)
+    http_cache.bump_reservations(current_user.id)
     return {"reservations": records, "booked": len(records), "requested": quantity}, 201
 
 
@@ -90,7 +135,9 @@ def reservations_release(reservation_id: int):
     record = release_reservation(reservation_id, current_user.id)
     if not record:
         return {"error": "not found"}, 404
-    _bust_lot_caches()
+    http_cache.bump_reservations(current_user.id)
+    if record.get("lot_id") is not None:
+        _bust_lot_caches(int(record["lot_id"]))
     return record
 
 
@@ -98,12 +145,49 @@ def reservations_release(reservation_id: int):
 @login_required
 def request_export():
     require_user()
-    job = export_jobs.create_job(current_user.id)
+    payload = request.get_json(silent=True) or {}
+    file_format = "csv.gz" if payload.get("compress") else "csv"
+    mode = payload.get("mode") or "full"
+    if mode not in export_jobs.MODES:
+        return {"error": f"mode must be one of {', '.join(export_jobs.MODES)}"}, 400
+    range_start = range_end = None
+    if mode == "range":
+        try:
+            range_start = timestamp_bound(payload.get("from"))
+            range_end = timestamp_bound(payload.get("to"), end=True)
+        except ValueError:
+            return {"error": "from/to must be ISO dates"}, 400
+        if range_start is None and range_end is None:
+            return {"error": "range export needs from or to"}, 400
+        if range_start and range_end and range_start >= range_end:
+            return {"error": "from must be before to"}, 400
+    watermark, _ = export_watermark(current_user.id)
+    outcome, job = export_jobs.create_or_reuse_job(
+        current_user.id, file_format, watermark, mode, range_start, range_end
+    )
     job_id = job.get("id")
     if job_id is None:
         return {"error": "export failed"}, 500
-    enqueue_export(int(job_id))
-    return {"job": job}, 202
+    if outcome == "reused":
+        # Nothing changed since this file was generated.
+        job["download_url"] = url_for("user.download_export", job_id=job_id)
+        return {"job": job, "reused": True}, 200
+    if outcome == "created":
+        enqueue_export(int(job_id))
+    return {"job": job, "deduplicated": outcome == "in_flight"}, 202
+
+
+@bp.get("/exports/<int:job_id>")
+@login_required
+def export_status(job_id: int) -> dict[str, object]:
+    # Cheap polling endpoint for a single job's status and progress.
+    require_user()
+    job = export_jobs.get_job(job_id)
+    if not job or int(job.get("user_id", 0)) != current_user.id:
+        abort(404, description="not found")
+    if job.get("file_path"):
+        job["download_url"] = url_for("user.download_export", job_id=job_id)
+    return {"job": job}
 
 
 @bp.get("/exports")
@@ -117,6 +201,17 @@ def list_exports() -> dict[str, object]:
     return {"jobs": jobs}
 
 
+def _export_variant(job: dict[str, object]) -> tuple[Path, bool]:
+    # Pick the file to send: the precompressed sibling of a plain CSV when
+    # the client accepts gzip, otherwise the export itself.
+    path = Path(str(job["file_path"]))
+    if job.get("format") == "csv" and request.accept_encodings["gzip"]:
+        encoded = path.with_name(path.name + ".gz")
+        if encoded.exists():
+            return encoded, True
+    return path, False
+
+
 @bp.get("/exports/<int:job_id>/download")
 @login_required
 def download_export(job_id: int):
@@ -124,4 +219,42 @@ def download_export(job_id: int):
     job = export_jobs.get_job(job_id)
     if not job or int(job.get("user_id", 0)) != current_user.id or not job.get("file_path"):
         abort(404, description="not found")
-    return send_file(job["file_path"], as_attachment=True)
+    served, encoded = _export_variant(job)
+    try:
+        stat = served.stat()
+    except FileNotFoundError:
+        abort(404, description="not found")
+    # Files are written once and replaced atomically, so job, size and mtime
+    # identify the bytes; each encoding gets its own tag.
+    etag = f"export-{job_id}-{stat.st_size}-{stat.st_mtime_ns}{'-gz' if encoded else ''}"
+    download_name = Path(str(job["file_path"])).name
+    mimetype = "application/gzip" if job.get("format") == "csv.gz" else "text/csv"
+    accel_prefix = current_app.config.get("EXPORT_ACCEL_REDIRECT_PREFIX")
+    if accel_prefix:
+        # nginx serves the bytes (and Range requests) from an internal location.
+        response = current_app.response_class(mimetype=mimetype)
+        response.headers["X-Accel-Redirect"] = f"{accel_prefix.rstrip('/')}/{served.name}"
+        response.headers["Content-Disposition"] = f'attachment; filename="{download_name}"'
+        response.set_etag(etag)
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+            response.set_etag(etag)
+    else:
+        # conditional=True covers If-None-Match/304 and Range/206; Flask adds
+        # X-Sendfile itself when USE_X_SENDFILE is on.
+        response = send_file(
+            served,
+            mimetype=mimetype,
+            as_attachment=True,
+            download_name=download_name,
+            conditional=True,
+            etag=etag,
+        )
+        response.accept_ranges = "bytes"
+    if encoded:
+        response.headers["Content-Encoding"] = "gzip"
+    if job.get("format") == "csv":
+        response.vary.add("Accept-Encoding")
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
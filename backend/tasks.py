@@ -2,22 +2,42 @@
 
 from __future__ import annotations
 
-from collections import Counter
+import csv
+import gzip
+import os
+import shutil
+import time
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from html import escape
+from itertools import groupby
+from operator import itemgetter
 from pathlib import Path
-from typing import Callable
+from typing import IO, Callable, Iterable, Iterator, Optional
 
 from celery import Celery, Task
+from flask import current_app
 
-from .models import export_jobs, lots, reservations, users
+from . import http_cache, lot_cache, lot_events, profiling
+from .models import archive, db, export_jobs, lots, reservations, rollups, task_runs, users
 
-EXPORT_DIR = Path("exports")
 NOTIFICATION_DIR = Path("notifications")
 REPORT_DIR = Path("reports")
 
+EXPORT_HEADER = ("reservation_id", "spot_id", "lot", "parked_at", "left_at", "cost")
+EXPORT_BATCH_SIZE = 1000
+REMINDER_BATCH_SIZE = 1000
+# Users per report subtask.
+REPORT_CHUNK_SIZE = 200
+
 _run_export_task: Task | None = None
 _daily_task: Task | None = None
 _monthly_task: Task | None = None
+_report_chunk_task: Task | None = None
+_checkpoint_task: Task | None = None
+_reconcile_task: Task | None = None
+_rollup_task: Task | None = None
+_archive_task: Task | None = None
 
 
 def _ensure_dir(path: Path) -> Path:
@@ -27,15 +47,21 @@ def _ensure_dir(path: Path) -> Path:
 
 
 def _register(celery_app: Celery, func: Callable[..., None], name: str) -> Task:
-    return celery_app.task(name=name)(func)
+    return celery_app.task(name=name)(profiling.profile_task(name, func))
 
 
 def configure(celery_app: Celery) -> None:
     # Register Celery tasks.
-    global _run_export_task, _daily_task, _monthly_task
+    global _run_export_task, _daily_task, _monthly_task, _report_chunk_task
+    global _checkpoint_task, _reconcile_task, _rollup_task, _archive_task
     _run_export_task = _register(celery_app, run_export_job, "backend.tasks.run_export_job")
     _daily_task = _register(celery_app, send_daily_reminders, "backend.tasks.send_daily_reminders")
     _monthly_task = _register(celery_app, send_monthly_reports, "backend.tasks.send_monthly_reports")
+    _report_chunk_task = _register(celery_app, render_report_chunk, "backend.tasks.render_report_chunk")
+    _checkpoint_task = _register(celery_app, checkpoint_database, "backend.tasks.checkpoint_database")
+    _reconcile_task = _register(celery_app, reconcile_lot_counters, "backend.tasks.reconcile_lot_counters")
+    _rollup_task = _register(celery_app, refresh_usage_rollups, "backend.tasks.refresh_usage_rollups")
+    _archive_task = _register(celery_app, archive_reservations, "backend.tasks.archive_reservations")
 
 
 def enqueue_export(job_id: int) -> None:
@@ -45,88 +71,252 @@ def enqueue_export(job_id: int) -> None:
     _run_export_task.delay(job_id)
 
 
+def _open_export(path: Path, compressed: bool) -> IO[str]:
+    if compressed:
+        return gzip.open(path, "wt", encoding="utf-8", newline="")
+    return path.open("w", encoding="utf-8", newline="")
+
+
+def _precompress(path: Path) -> Path:
+    # Gzip sibling served to clients that send Accept-Encoding: gzip.
+    target = path.with_name(path.name + ".gz")
+    partial = target.with_name(target.name + ".part")
+    try:
+        with path.open("rb") as source, gzip.open(partial, "wb") as handle:
+            shutil.copyfileobj(source, handle, 1024 * 1024)
+        os.replace(partial, target)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+    return target
+
+
+def write_export(
+    handle: IO[str],
+    rows: Iterable[tuple],
+    batch_size: int = EXPORT_BATCH_SIZE,
+    on_batch: Optional[Callable[[int], None]] = None,
+) -> int:
+    # Write rows as they stream in, flushing and reporting once per batch.
+    writer = csv.writer(handle)
+    writer.writerow(EXPORT_HEADER)
+    written = 0
+    for row in rows:
+        writer.writerow(row)
+        written += 1
+        if written % batch_size == 0:
+            handle.flush()
+            if on_batch is not None:
+                on_batch(written)
+    return written
+
+
+def _export_window(job: dict[str, object]) -> tuple[dict[str, object], str | None, str | None]:
+    # Query filters for the job's mode plus the (since, until] change window
+    # it covers. Full exports record the window too so the next delta starts
+    # where they left off; rows touched during the run may appear twice, but
+    # none are skipped.
+    mode = job.get("mode") or "full"
+    if mode == "range":
+        return {"parked_from": job.get("range_start"), "parked_before": job.get("range_end")}, None, None
+    until = datetime.utcnow().replace(microsecond=0) - timedelta(seconds=1)
+    if mode != "delta":
+        return {}, None, until.isoformat()
+    previous = export_jobs.last_delivered_until(int(job["user_id"]))
+    since = datetime.fromisoformat(previous) if previous else None
+    window = {"changed_since": since, "changed_until": until}
+    return window, previous, until.isoformat()
+
+
 def run_export_job(job_id: int) -> None:
     # Generate CSV export for user reservations.
     job = export_jobs.get_job(job_id)
     if not job:
         return
-    export_jobs.mark_processing(job_id)
-    rows = reservations.list_user_reservations(int(job["user_id"]))
-    export_dir = _ensure_dir(EXPORT_DIR)
-    file_path = export_dir / f"export_{job['user_id']}_{job_id}.csv"
-    lines = ["reservation_id,spot_id,lot,parked_at,left_at,cost"]
-    for row in rows:
-        lines.append(
-            ",".join(
-                [
-                    str(row.get("id", "")),
-                    str(row.get("spot_id", "")),
-                    str(row.get("lot", "")),
-                    str(row.get("parked_at", "")),
-                    str(row.get("left_at", "")),
-                    str(row.get("cost", "")),
-                ]
+    user_id = int(job["user_id"])
+    window, since_at, until_at = _export_window(job)
+    watermark, total_rows = reservations.export_watermark(user_id)
+    if window:
+        total_rows = reservations.count_user_reservations(user_id, **window)
+    export_jobs.mark_processing(job_id, watermark, total_rows, since_at, until_at)
+    compressed = job.get("format") == "csv.gz"
+    file_path = export_jobs.export_dir() / f"export_{job['user_id']}_{job_id}.{job.get('format') or 'csv'}"
+    # Write to a side file so a crash never leaves a truncated export behind.
+    partial = file_path.with_name(file_path.name + ".part")
+    rows = reservations.iter_user_reservations(user_id, EXPORT_BATCH_SIZE, **window)
+    try:
+        with _open_export(partial, compressed) as handle:
+            written = write_export(
+                handle,
+                rows,
+                on_batch=lambda count: export_jobs.update_progress(job_id, count),
             )
+        os.replace(partial, file_path)
+        if not compressed and current_app.config.get("EXPORT_PRECOMPRESS", True):
+            _precompress(file_path)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        export_jobs.mark_failed(job_id)
+        raise
+    export_jobs.mark_completed(job_id, str(file_path.resolve()), written)
+
+
+@contextmanager
+def _tracked_run(task: str) -> Iterator[dict[str, int]]:
+    # Record the run's wall time and row counts in task_runs.
+    run_id = task_runs.start_run(task)
+    stats = {"rows_read": 0, "rows_written": 0}
+    started = time.perf_counter()
+    status, detail = "completed", None
+    try:
+        yield stats
+    except BaseException as exc:
+        status, detail = "failed", repr(exc)
+        raise
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        task_runs.finish_run(run_id, status, elapsed_ms, stats["rows_read"], stats["rows_written"], detail)
+        current_app.logger.info(
+            "%s %s in %.1f ms (read %d, wrote %d)",
+            task, status, elapsed_ms, stats["rows_read"], stats["rows_written"],
         )
-    file_path.write_text("\n".join(lines), encoding="utf-8")
-    export_jobs.mark_completed(job_id, str(file_path.resolve()))
 
 
-def send_daily_reminders() -> None:
+def send_daily_reminders() -> dict[str, int]:
     # Send daily reminder logs for inactive users.
-    cutoff = datetime.utcnow() - timedelta(days=1)
-    since = cutoff.isoformat()
-    if not lots.list_available_lots():
-        return
-    reminders: list[str] = []
-    for user in users.list_all_users():
-        if user.get("role") != "user":
-            continue
-        recent = reservations.recent_activity_count(int(user["id"]), since)
-        if recent == 0:
-            reminders.append(
-                f"{datetime.utcnow().isoformat()} :: {user['username']} :: please book a spot if needed"
-            )
-    if reminders:
-        log_file = _ensure_dir(NOTIFICATION_DIR) / f"reminders_{datetime.utcnow().date()}.txt"
-        with log_file.open("a", encoding="utf-8") as handle:
-            handle.write("\n".join(reminders) + "\n")
-
-
-def send_monthly_reports() -> None:
-    # Generate monthly activity reports for all users.
-    window_start = datetime.utcnow() - timedelta(days=30)
-    since = window_start.isoformat()
-    report_dir = _ensure_dir(REPORT_DIR)
-    for user in users.list_all_users():
-        if user.get("role") != "user":
-            continue
-        bookings = reservations.monthly_summary(int(user["id"]), since)
-        if not bookings:
-            continue
-        total_cost = sum(float(entry.get("cost") or 0) for entry in bookings)
-        lot_counter = Counter(entry.get("lot") for entry in bookings if entry.get("lot"))
-        most_used = lot_counter.most_common(1)[0][0] if lot_counter else "N/A"
-        rows = "".join(
-            f"<tr><td>{entry.get('id')}</td><td>{entry.get('lot')}</td><td>{entry.get('parked_at')}</td><td>{entry.get('left_at') or ''}</td><td>{entry.get('cost')}</td></tr>"
-            for entry in bookings
-        )
-        html = f"""
+    with _tracked_run("send_daily_reminders") as stats:
+        if not lots.has_available_lots():
+            return stats
+        now = datetime.utcnow()
+        since = (now - timedelta(days=1)).strftime(reservations.SQL_TIMESTAMP_FORMAT)
+        stamp = now.isoformat()
+        log_file = _ensure_dir(NOTIFICATION_DIR) / f"reminders_{now.date()}.txt"
+        handle: Optional[IO[str]] = None
+        try:
+            for batch in users.iter_inactive_users(since, REMINDER_BATCH_SIZE):
+                if handle is None:
+                    # One buffered append for the whole run.
+                    handle = log_file.open("a", encoding="utf-8", buffering=1024 * 1024)
+                handle.writelines(f"{stamp} :: {username} :: please book a spot if needed\n" for _, username in batch)
+                stats["rows_read"] += len(batch)
+                stats["rows_written"] += len(batch)
+        finally:
+            if handle is not None:
+                handle.close()
+    return stats
+
+
+def send_monthly_reports() -> dict[str, int]:
+    # Generate monthly activity reports, fanned out in chunks of users.
+    run_id = task_runs.start_run("send_monthly_reports")
+    started = time.time()
+    now = datetime.utcnow()
+    since = (now - timedelta(days=30)).strftime(reservations.SQL_TIMESTAMP_FORMAT)
+    report_date = str(now.date())
+    total = chunks = 0
+    try:
+        for headers in reservations.iter_monthly_totals(since, REPORT_CHUNK_SIZE):
+            total += len(headers)
+            chunks += 1
+            _dispatch_report_chunk(run_id, started, since, report_date, headers)
+    except BaseException as exc:
+        task_runs.fail_run(run_id, (time.time() - started) * 1000, repr(exc))
+        raise
+    task_runs.mark_dispatched(run_id, total)
+    # Covers runs with no reports and chunks that finished before dispatch ended.
+    task_runs.complete_if_done(run_id, (time.time() - started) * 1000)
+    return {"users": total, "chunks": chunks}
+
+
+def _dispatch_report_chunk(
+    run_id: int, started: float, since: str, report_date: str, headers: list[dict[str, object]]
+) -> None:
+    if _report_chunk_task is None:
+        render_report_chunk(run_id, started, since, report_date, headers)
+    else:
+        _report_chunk_task.delay(run_id, started, since, report_date, headers)
+
+
+def render_report_chunk(
+    run_id: int, started: float, since: str, report_date: str, headers: list[dict[str, object]]
+) -> int:
+    # Render one chunk of reports from a single streamed detail query.
+    by_user = {int(header["user_id"]): header for header in headers}
+    written = 0
+    try:
+        report_dir = _ensure_dir(REPORT_DIR)
+        details = reservations.iter_monthly_details(list(by_user), since)
+        for user_id, bookings in groupby(details, key=itemgetter(0)):
+            header = by_user[user_id]
+            report_file = report_dir / f"report_{header['username']}_{report_date}.html"
+            report_file.write_text(_render_report(header, bookings), encoding="utf-8")
+            written += 1
+        task_runs.add_rows_written(run_id, len(headers))
+    except BaseException as exc:
+        task_runs.fail_run(run_id, (time.time() - started) * 1000, repr(exc))
+        raise
+    if task_runs.complete_if_done(run_id, (time.time() - started) * 1000):
+        current_app.logger.info("send_monthly_reports completed in %.1f s", time.time() - started)
+    return written
+
+
+def _render_report(header: dict[str, object], bookings: Iterable[tuple]) -> str:
+    rows = [
+        f"<tr><td>{reservation_id}</td><td>{escape(str(lot))}</td><td>{parked_at}</td>"
+        f"<td>{left_at or ''}</td><td>{cost}</td></tr>"
+        for _, reservation_id, lot, parked_at, left_at, cost in bookings
+    ]
+    return f"""
         <html>
           <body>
-            <h2>Monthly Activity Report for {user.get('username')}</h2>
-            <p>Total Reservations: {len(bookings)}</p>
-            <p>Total Cost: {total_cost:.2f}</p>
-            <p>Most Used Lot: {most_used}</p>
+            <h2>Monthly Activity Report for {escape(str(header['username']))}</h2>
+            <p>Total Reservations: {header['bookings']}</p>
+            <p>Total Cost: {float(header['total_cost'] or 0):.2f}</p>
+            <p>Most Used Lot: {escape(str(header['most_used'] or 'N/A'))}</p>
             <table border="1" cellpadding="4">
               <thead><tr><th>ID</th><th>Lot</th><th>Parked At</th><th>Left At</th><th>Cost</th></tr></thead>
-              <tbody>{rows}</tbody>
+              <tbody>{"".join(rows)}</tbody>
             </table>
           </body>
         </html>
         """
-        report_file = report_dir / f"report_{user.get('username')}_{datetime.utcnow().date()}.html"
-        report_file.write_text(html, encoding="utf-8")
+
+
+def checkpoint_database() -> dict[str, int]:
+    # Periodically fold the WAL into the main database so it stays small.
+    return db.checkpoint(current_app.config.get("SQLITE_CHECKPOINT_MODE", "TRUNCATE"))
+
+
+def reconcile_lot_counters() -> int:
+    # Repair drift between parking_lots counters and parking_spots.
+    drift = lots.reconcile_availability_counters(repair=True)
+    if drift:
+        lot_ids = [int(lot["id"]) for lot in drift]
+        current_app.logger.warning("repaired availability counters for lots %s", lot_ids)
+        lot_cache.invalidate(*lot_ids)
+        lot_events.publish_lots(*lot_ids)
+    return len(drift)
+
+
+def refresh_usage_rollups() -> dict[str, int]:
+    # Fold newly closed reservations into the hourly/daily usage rollups.
+    with _tracked_run("refresh_usage_rollups") as stats:
+        stats["rows_read"] = rollups.refresh()
+    return stats
+
+
+def archive_reservations() -> dict[str, int]:
+    # Move old closed reservations to the archive, then compact.
+    config = current_app.config
+    with _tracked_run("archive_reservations") as stats:
+        # Archival only takes rows the rollups have already counted.
+        stats["rows_read"] = rollups.refresh()
+        stats["rows_written"] = archive.archive_closed(config["ARCHIVE_AFTER_DAYS"], config["ARCHIVE_BATCH_SIZE"])
+        if stats["rows_written"]:
+            # Archived rows leave the default reservation listings.
+            http_cache.bump_reservations()
+            archive.compact(vacuum=config["ARCHIVE_VACUUM"])
+    return stats
 
 
 __all__ = ["configure", "enqueue_export"]
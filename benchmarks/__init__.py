@@ -0,0 +1 @@
+"""Benchmarks for the parking backend; run modules with ``python -m``."""
@@ -0,0 +1,138 @@
+"""Compare the in-memory spot allocator with the SQL first-free-spot query.
+
+Usage: python -m benchmarks.allocator --spots 20000 --bookings 5000 [--drop-indexes]
+
+Timings cover picking and marking a spot inside the write transaction; the
+commit is excluded because it costs the same on both paths.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+SQL_PICK = "SELECT id FROM parking_spots WHERE lot_id = ? AND status = 'A' ORDER BY id LIMIT 1"
+
+
+def _prepare(db_path: Path, spots: int, prefill: float):
+    # Import lazily so PARKING_DB_PATH points the backend at the scratch file.
+    os.environ["PARKING_DB_PATH"] = str(db_path)
+    from backend.models import db, lots
+
+    db.configure_pool(db_path)
+    lot = lots.create_lot("bench", 10.0, spots, None, None)
+    conn = db.get_connection()
+    occupied = int(spots * prefill)
+    conn.execute(
+        "UPDATE parking_spots SET status = 'O' WHERE id IN "
+        "(SELECT id FROM parking_spots WHERE lot_id = ? ORDER BY id LIMIT ?)",
+        (lot["id"], occupied),
+    )
+    conn.commit()
+    return conn, int(lot["id"])
+
+
+def _book(conn, spot_id: int) -> None:
+    conn.execute("UPDATE parking_spots SET status = 'O' WHERE id = ? AND status = 'A'", (spot_id,))
+
+
+def _reset(conn, lot_id: int, spot_ids: list[int]) -> None:
+    conn.executemany("UPDATE parking_spots SET status = 'A' WHERE id = ?", [(i,) for i in spot_ids])
+    conn.commit()
+
+
+def run_sql(conn, lot_id: int, bookings: int) -> tuple[float, list[int]]:
+    from backend.models.db import begin_immediate
+
+    picked: list[int] = []
+    elapsed = 0.0
+    for _ in range(bookings):
+        begin_immediate(conn)
+        started = time.perf_counter()
+        row = conn.execute(SQL_PICK, (lot_id,)).fetchone()
+        if row is None:
+            conn.rollback()
+            break
+        _book(conn, row["id"])
+        elapsed += time.perf_counter() - started
+        conn.commit()
+        picked.append(row["id"])
+    return elapsed, picked
+
+
+def run_allocator(conn, lot_id: int, bookings: int) -> tuple[float, float, list[int]]:
+    from backend.models.allocator import allocator
+    from backend.models.db import begin_immediate
+
+    allocator.invalidate(lot_id)
+    started = time.perf_counter()
+    allocator.claim(conn, lot_id, 0)
+    load_time = time.perf_counter() - started
+    picked: list[int] = []
+    elapsed = 0.0
+    for _ in range(bookings):
+        begin_immediate(conn)
+        started = time.perf_counter()
+        spot_ids = allocator.claim(conn, lot_id, 1)
+        elapsed += time.perf_counter() - started
+        if not spot_ids:
+            conn.rollback()
+            break
+        conn.commit()
+        picked.append(spot_ids[0])
+    return load_time, elapsed, picked
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--spots", type=int, default=20000)
+    parser.add_argument("--bookings", type=int, default=5000)
+    parser.add_argument("--prefill", type=float, default=0.5, help="fraction of spots occupied up front")
+    parser.add_argument(
+        "--drop-indexes",
+        action="store_true",
+        help="drop the parking_spots indexes to measure the pre-migration SQL path",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        db_path = Path(scratch) / "bench.db"
+        os.environ["PARKING_DB_PATH"] = str(db_path)
+        from backend.models import db, migrations
+
+        db.configure_pool(db_path)
+        db.initialize_database()
+        migrations.apply_migrations()
+        conn, lot_id = _prepare(db_path, args.spots, args.prefill)
+        if args.drop_indexes:
+            conn.execute("DROP INDEX IF EXISTS idx_parking_spots_lot_status")
+            conn.execute("DROP INDEX IF EXISTS idx_parking_spots_available")
+
+        sql_time, sql_ids = run_sql(conn, lot_id, args.bookings)
+        _reset(conn, lot_id, sql_ids)
+        load_time, alloc_time, alloc_ids = run_allocator(conn, lot_id, args.bookings)
+        _reset(conn, lot_id, alloc_ids)
+        db.close_connection()
+
+    assert sql_ids == alloc_ids, "allocator picked different spots than the SQL path"
+    report = {
+        "spots": args.spots,
+        "bookings": len(sql_ids),
+        "prefill": args.prefill,
+        "indexes": not args.drop_indexes,
+        "sql": {"seconds": round(sql_time, 4), "us_per_booking": round(sql_time / max(len(sql_ids), 1) * 1e6, 1)},
+        "allocator": {
+            "load_seconds": round(load_time, 4),
+            "seconds": round(alloc_time, 4),
+            "us_per_booking": round(alloc_time / max(len(alloc_ids), 1) * 1e6, 1),
+        },
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
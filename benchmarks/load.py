@@ -0,0 +1,313 @@
+"""Drive a mixed workload through the Flask test client and report latency.
+
+Usage: python -m benchmarks.load [--db seeded.db] [--threads 8] [--duration 15] \
+           [--mix browse=40,book=12,burst=3,release=15,history=10,export=5,dashboard=10] \
+           [--output run.json] [--compare baseline.json]
+
+Without --db a scratch dataset is seeded first (see benchmarks.seed for the
+sizing flags). Runs fully offline: the cache uses the in-memory backend and
+Celery runs export tasks eagerly in the requesting thread. Results are JSON
+so two runs can be diffed, or compared directly with --compare.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable
+
+from . import seed as seeding
+
+# operation -> label reported in the results
+OPERATIONS = {
+    "browse": "GET /api/user/lots",
+    "book": "POST /api/user/reservations",
+    "burst": "POST /api/user/reservations (quantity 2-10)",
+    "release": "POST /api/user/reservations/<id>/release",
+    "history": "GET /api/user/reservations",
+    "export": "POST /api/user/exports",
+    "dashboard": "GET /api/admin/dashboard",
+}
+DEFAULT_MIX = "browse=40,book=12,burst=3,release=15,history=10,export=5,dashboard=10"
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    mix: dict[str, float] = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation {name!r}; choose from {', '.join(OPERATIONS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class Recorder:
+    """Latencies and outcomes per operation, shared by the worker threads."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.rejected: dict[str, int] = defaultdict(int)
+        self.errors: dict[str, int] = defaultdict(int)
+
+    def record(self, operation: str, status: int, seconds: float) -> None:
+        with self._lock:
+            self.latencies[operation].append(seconds)
+            if status >= 500:
+                self.errors[operation] += 1
+            elif status >= 400:
+                self.rejected[operation] += 1
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    # Nearest-rank percentile of an already sorted list.
+    if not sorted_values:
+        return 0.0
+    rank = max(1, min(len(sorted_values), int(round(fraction * len(sorted_values) + 0.5))))
+    return sorted_values[rank - 1]
+
+
+def summarise(recorder: Recorder, wall_seconds: float) -> dict[str, Any]:
+    endpoints: dict[str, Any] = {}
+    everything: list[float] = []
+    for operation, values in sorted(recorder.latencies.items()):
+        ordered = sorted(values)
+        everything.extend(ordered)
+        endpoints[operation] = {
+            "endpoint": OPERATIONS[operation],
+            "requests": len(ordered),
+            "rps": round(len(ordered) / wall_seconds, 1),
+            "rejected_4xx": recorder.rejected.get(operation, 0),
+            "errors_5xx": recorder.errors.get(operation, 0),
+            "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+            "p50_ms": round(percentile(ordered, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(ordered, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(ordered, 0.99) * 1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2),
+        }
+    everything.sort()
+    total = {
+        "requests": len(everything),
+        "rps": round(len(everything) / wall_seconds, 1) if wall_seconds else 0.0,
+        "p50_ms": round(percentile(everything, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(everything, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(everything, 0.99) * 1000, 2),
+        "errors_5xx": sum(recorder.errors.values()),
+    }
+    return {"wall_seconds": round(wall_seconds, 3), "total": total, "endpoints": endpoints}
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any]) -> dict[str, Any]:
+    # Relative change per endpoint; negative latency change is an improvement.
+    def change(new: float, old: float) -> float | None:
+        return round((new - old) / old * 100, 1) if old else None
+
+    result: dict[str, Any] = {}
+    rows = {"total": (current["total"], baseline.get("total", {}))}
+    for operation, stats in current["endpoints"].items():
+        rows[operation] = (stats, baseline.get("endpoints", {}).get(operation, {}))
+    for name, (new, old) in rows.items():
+        if not old:
+            continue
+        result[name] = {
+            "rps_change_pct": change(new["rps"], old.get("rps", 0)),
+            "p50_change_pct": change(new["p50_ms"], old.get("p50_ms", 0)),
+            "p95_change_pct": change(new["p95_ms"], old.get("p95_ms", 0)),
+            "p99_change_pct": change(new["p99_ms"], old.get("p99_ms", 0)),
+        }
+    return result
+
+
+def _login(app: Any, username: str, password: str) -> Any:
+    client = app.test_client()
+    response = client.post("/api/auth/login", json={"username": username, "password": password})
+    if response.status_code != 200:
+        raise SystemExit(f"login failed for {username}: {response.status_code} {response.get_data(as_text=True)}")
+    return client
+
+
+class Worker(threading.Thread):
+    """One simulated user issuing operations drawn from the mix."""
+
+    def __init__(
+        self,
+        app: Any,
+        index: int,
+        mix: dict[str, float],
+        lot_ids: list[int],
+        recorder: Recorder,
+        start: threading.Barrier,
+        should_stop: Callable[[int], bool],
+        warmup: int,
+        rng_seed: int,
+    ) -> None:
+        super().__init__(name=f"load-{index}", daemon=True)
+        self.rng = random.Random(rng_seed + index)
+        self.user = _login(app, seeding.username(index), seeding.BENCH_PASSWORD)
+        self.admin = _login(app, "admin", "admin123") if "dashboard" in mix else None
+        self.operations = list(mix)
+        self.weights = [mix[name] for name in self.operations]
+        self.lot_ids = lot_ids
+        self.recorder = recorder
+        self.start_barrier = start
+        self.should_stop = should_stop
+        self.warmup = warmup
+        self.open_reservations: list[int] = []
+
+    def _request(self, operation: str) -> int:
+        if operation == "browse":
+            return self.user.get("/api/user/lots").status_code
+        if operation in ("book", "burst"):
+            response = self.user.post(
+                "/api/user/reservations",
+                json={
+                    "lot_id": self.rng.choice(self.lot_ids),
+                    "quantity": 1 if operation == "book" else self.rng.randint(2, 10),
+                    "vehicle_number": seeding.vehicle_number(self.rng),
+                },
+            )
+            if response.status_code == 201:
+                self.open_reservations.extend(int(item["id"]) for item in response.get_json()["reservations"])
+            return response.status_code
+        if operation == "release":
+            reservation_id = self.open_reservations.pop(self.rng.randrange(len(self.open_reservations)))
+            return self.user.post(f"/api/user/reservations/{reservation_id}/release").status_code
+        if operation == "history":
+            return self.user.get("/api/user/reservations").status_code
+        if operation == "export":
+            return self.user.post("/api/user/exports", json={"mode": "full"}).status_code
+        return self.admin.get("/api/admin/dashboard").status_code
+
+    def run(self) -> None:
+        self.start_barrier.wait()
+        issued = 0
+        while not self.should_stop(issued):
+            operation = self.rng.choices(self.operations, self.weights)[0]
+            if operation == "release" and not self.open_reservations:
+                operation = "book"
+            started = time.perf_counter()
+            status = self._request(operation)
+            elapsed = time.perf_counter() - started
+            issued += 1
+            if issued > self.warmup:
+                self.recorder.record(operation, status, elapsed)
+
+
+def run_load(
+    app: Any,
+    *,
+    threads: int,
+    mix: dict[str, float],
+    duration: float | None,
+    requests: int | None,
+    warmup: int,
+    rng_seed: int,
+) -> dict[str, Any]:
+    from backend.models import lots
+
+    with app.app_context():
+        lot_ids = [int(lot_id) for lot_id in lots.list_lot_ids()]
+    if not lot_ids:
+        raise SystemExit("dataset has no lots; seed it first")
+    recorder = Recorder()
+    barrier = threading.Barrier(threads + 1)
+    deadline: list[float] = [0.0]
+
+    def should_stop(issued: int) -> bool:
+        if requests is not None:
+            return issued >= requests + warmup
+        return time.perf_counter() >= deadline[0]
+
+    workers = [
+        Worker(app, index, mix, lot_ids, recorder, barrier, should_stop, warmup, rng_seed) for index in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    deadline[0] = time.perf_counter() + (duration or 0.0)
+    started = time.perf_counter()
+    barrier.wait()
+    for worker in workers:
+        worker.join()
+    return summarise(recorder, time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="existing dataset from benchmarks.seed (default: seed a scratch file)")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds to run (ignored with --requests)")
+    parser.add_argument("--requests", type=int, default=None, help="requests per thread instead of a duration")
+    parser.add_argument("--warmup", type=int, default=20, help="unrecorded requests per thread")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument("--label", default=None, help="free-form tag stored in the output")
+    parser.add_argument("--output", help="write the JSON report here as well as stdout")
+    parser.add_argument("--compare", help="earlier JSON report to compare against")
+    seeding.add_arguments(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        db_path = Path(args.db) if args.db else Path(scratch) / "load.db"
+        dataset: dict[str, Any] = {"db": str(db_path)}
+        if not args.db:
+            args.users = max(args.users, args.threads)
+            dataset = seeding.seed_from_args(db_path, args)
+        os.environ["PARKING_DB_PATH"] = str(db_path)
+        os.environ["PARKING_CACHE_MODE"] = "memory"
+        from backend.app import app, celery
+
+        celery.conf.task_always_eager = True
+        app.config["TESTING"] = True
+        # Keep benchmark exports out of the real export directory.
+        app.config["EXPORT_DIR"] = str(Path(scratch) / "exports")
+
+        results = run_load(
+            app,
+            threads=args.threads,
+            mix=args.mix,
+            duration=None if args.requests else args.duration,
+            requests=args.requests,
+            warmup=args.warmup,
+            rng_seed=args.seed,
+        )
+
+    report: dict[str, Any] = {
+        "label": args.label,
+        "config": {
+            "threads": args.threads,
+            "duration": None if args.requests else args.duration,
+            "requests_per_thread": args.requests,
+            "warmup": args.warmup,
+            "mix": args.mix,
+            "seed": args.seed,
+        },
+        "dataset": dataset,
+        "environment": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+        },
+        **results,
+    }
+    if args.compare:
+        report["comparison"] = compare(results, json.loads(Path(args.compare).read_text()))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    print(text)
+    if results["total"]["errors_5xx"]:
+        print(f"{results['total']['errors_5xx']} requests failed with 5xx", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Check that every registered model query still uses its indexes.
+
+Usage: python -m benchmarks.plans [--db seeded.db] [--query NAME ...] [--json]
+
+Without --db a scratch dataset is seeded first (see benchmarks.seed for the
+sizing flags) and the write probes run too; against an existing file only
+read queries are checked. Exits 1 when a query fully scans a large table,
+so it can gate CI.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+from . import seed as seeding
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="existing database to check read-only (default: seed a scratch file)")
+    parser.add_argument("--query", action="append", help="only check this registered query (repeatable)")
+    parser.add_argument("--json", action="store_true", help="print the full report including plans")
+    seeding.add_arguments(parser)
+    parser.set_defaults(users=500, reservations=50_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        db_path = Path(args.db) if args.db else Path(scratch) / "plans.db"
+        if not args.db:
+            seeding.seed_from_args(db_path, args)
+        os.environ["PARKING_DB_PATH"] = str(db_path)
+        os.environ["PARKING_CACHE_MODE"] = "memory"
+        from backend.app import app
+        from backend.query_plans import check_plans
+
+        with app.app_context():
+            report = check_plans(include_writes=not args.db, names=args.query)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for result in report["queries"]:
+            status = "ok  " if result["ok"] else "FAIL"
+            print(f"{status} {result['ms']:>9.2f} ms  {result['name']}")
+            for problem in result["problems"]:
+                print(f"       {problem}")
+        print(f"{report['checked']} checked, {len(report['failed'])} failed, {len(report['skipped'])} skipped")
+    sys.exit(0 if report["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Generate a synthetic parking dataset into a scratch SQLite file.
+
+Usage: python -m benchmarks.seed --db /tmp/bench.db --lots 20 --spots-per-lot 200 \
+           --users 2000 --reservations 200000 [--seed 42]
+
+The same arguments and seed always produce the same rows. Seeded users are
+``bench_user_<n>`` with password ``bench``; the usual admin/admin123
+account is created by the schema bootstrap.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+BENCH_PASSWORD = "bench"
+SQL_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def username(index: int) -> str:
+    return f"bench_user_{index}"
+
+
+def vehicle_number(rng: random.Random) -> str:
+    letters = "ABCDEFGHJKLMNPRSTUVWXYZ"
+    return (
+        f"{rng.choice(letters)}{rng.choice(letters)}{rng.randint(10, 99)}"
+        f"{rng.choice(letters)}{rng.choice(letters)}{rng.randint(1000, 9999)}"
+    )
+
+
+def _open_database(db_path: Path):
+    # Point the backend at the scratch file before anything imports it.
+    os.environ["PARKING_DB_PATH"] = str(db_path)
+    os.environ.setdefault("PARKING_CACHE_MODE", "memory")
+    from backend.models import db, migrations
+
+    db.configure_pool(db_path)
+    db.initialize_database()
+    migrations.apply_migrations()
+    return db
+
+
+def seed(
+    db_path: Path | str,
+    *,
+    lots: int = 20,
+    spots_per_lot: int = 200,
+    users: int = 2000,
+    reservations: int = 200_000,
+    days: int = 365,
+    open_fraction: float = 0.02,
+    rng_seed: int = 42,
+) -> dict[str, Any]:
+    # Bulk-load the dataset with executemany in one transaction per table.
+    from werkzeug.security import generate_password_hash
+
+    db_path = Path(db_path)
+    db = _open_database(db_path)
+    conn = db.get_connection()
+    rng = random.Random(rng_seed)
+    started = time.perf_counter()
+
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+    first_user = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM users").fetchone()[0]
+    conn.executemany(
+        "INSERT INTO users (username, email, password_hash, role) VALUES (?, ?, ?, 'user')",
+        [(username(i), f"{username(i)}@example.com", password_hash) for i in range(users)],
+    )
+    user_ids = list(range(first_user, first_user + users))
+
+    lot_prices: dict[int, float] = {}
+    for index in range(lots):
+        price = float(rng.choice((20, 30, 40, 50, 60, 80)))
+        cursor = conn.execute(
+            "INSERT INTO parking_lots (name, price_per_hour, address, pin_code, total_spots) VALUES (?, ?, ?, ?, ?)",
+            (f"Bench Lot {index + 1}", price, f"{index + 1} Bench Street", f"{560000 + index}", spots_per_lot),
+        )
+        lot_prices[int(cursor.lastrowid)] = price
+        conn.executemany(
+            "INSERT INTO parking_spots (lot_id, status) VALUES (?, 'A')",
+            [(cursor.lastrowid,) for _ in range(spots_per_lot)],
+        )
+    conn.commit()
+    spots = [(int(row[0]), int(row[1])) for row in conn.execute("SELECT id, lot_id FROM parking_spots")]
+
+    # Open bookings occupy distinct spots; everything else is closed history.
+    open_count = min(int(reservations * open_fraction), len(spots) // 2)
+    open_spots = rng.sample(spots, open_count) if spots else []
+    now = datetime.utcnow().replace(microsecond=0)
+    rows = []
+    for index in range(reservations):
+        if not spots or not user_ids:
+            break
+        user_id = rng.choice(user_ids)
+        if index < open_count:
+            spot_id, lot_id = open_spots[index]
+            parked_at = now - timedelta(minutes=rng.randint(5, 72 * 60))
+            rows.append((spot_id, user_id, vehicle_number(rng), parked_at.strftime(SQL_TIMESTAMP_FORMAT), None, 0))
+            continue
+        spot_id, lot_id = rng.choice(spots)
+        parked_at = now - timedelta(days=days) + timedelta(seconds=rng.randint(0, days * 86400 - 86400))
+        hours = rng.uniform(0.25, 12)
+        left_at = parked_at + timedelta(hours=hours)
+        cost = round(max(hours, 1) * lot_prices[lot_id], 2)
+        rows.append(
+            (spot_id, user_id, vehicle_number(rng), parked_at.strftime(SQL_TIMESTAMP_FORMAT), left_at.isoformat(), cost)
+        )
+    conn.executemany(
+        "INSERT INTO reservations (spot_id, user_id, vehicle_number, parked_at, left_at, cost) VALUES (?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    conn.executemany(
+        "UPDATE parking_spots SET status = 'O' WHERE id = ?",
+        [(spot_id,) for spot_id, _ in open_spots],
+    )
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.commit()
+    db.close_connection()
+    return {
+        "db": str(db_path),
+        "lots": lots,
+        "spots": len(spots),
+        "users": users,
+        "reservations": len(rows),
+        "open_reservations": open_count,
+        "seed": rng_seed,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--lots", type=int, default=20)
+    parser.add_argument("--spots-per-lot", type=int, default=200)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--reservations", type=int, default=200_000)
+    parser.add_argument("--days", type=int, default=365, help="history window for closed reservations")
+    parser.add_argument("--open-fraction", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=42)
+
+
+def seed_from_args(db_path: Path | str, args: argparse.Namespace) -> dict[str, Any]:
+    return seed(
+        db_path,
+        lots=args.lots,
+        spots_per_lot=args.spots_per_lot,
+        users=args.users,
+        reservations=args.reservations,
+        days=args.days,
+        open_fraction=args.open_fraction,
+        rng_seed=args.seed,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", required=True, help="SQLite file to create (must not exist)")
+    add_arguments(parser)
+    args = parser.parse_args()
+    db_path = Path(args.db)
+    if db_path.exists():
+        parser.error(f"{db_path} already exists; seed into a fresh file")
+    print(json.dumps(seed_from_args(db_path, args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
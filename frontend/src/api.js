@@ -29,6 +29,15 @@ async function apiFetch(url, options = {}) {
   };
 }
 
+function withQuery(url, params = {}) {
+  const query = new URLSearchParams();
+  for (const [key, value] of Object.entries(params)) {
+    if (value !== undefined && value !== null && value !== "") query.set(key, value);
+  }
+  const text = query.toString();
+  return text ? `${url}?${text}` : url;
+}
+
 export const api = {
   auth: {
     profile: () => apiFetch("/api/auth/profile"),
@@ -43,17 +52,23 @@ export const api = {
       apiFetch(`/api/admin/lots/${lotId}`, { method: "PATCH", json: payload }),
     deleteLot: (lotId) => apiFetch(`/api/admin/lots/${lotId}`, { method: "DELETE" }),
     listUsers: () => apiFetch("/api/admin/users"),
-    listReservations: () => apiFetch("/api/admin/reservations"),
+    listReservations: (params) => apiFetch(withQuery("/api/admin/reservations", params)),
     dashboard: () => apiFetch("/api/admin/dashboard"),
   },
   user: {
     listLots: () => apiFetch("/api/user/lots"),
-    listReservations: () => apiFetch("/api/user/reservations"),
+    // Server-Sent Events with availability changes; EventSource reconnects
+    // by itself and resumes from the last event id it received.
+    lotStream: (lotIds) =>
+      new EventSource(withQuery("/api/user/lots/stream", { lots: lotIds?.join(",") }), {
+        withCredentials: true,
+      }),
+    listReservations: (params) => apiFetch(withQuery("/api/user/reservations", params)),
     createReservation: (payload) =>
       apiFetch("/api/user/reservations", { method: "POST", json: payload }),
     releaseReservation: (reservationId) =>
       apiFetch(`/api/user/reservations/${reservationId}/release`, { method: "POST" }),
-    requestExport: () => apiFetch("/api/user/exports", { method: "POST" }),
+    requestExport: (payload) => apiFetch("/api/user/exports", { method: "POST", json: payload }),
     listExports: () => apiFetch("/api/user/exports"),
   },
 };
@@ -34,7 +34,7 @@ export const AdminDashboard = {
       this.busy = false;
     },
     async loadReservations() {
-      const res = await api.admin.listReservations();
+      const res = await api.admin.listReservations({ limit: 100 });
       if (res.ok) {
         this.reservations = res.data.reservations || [];
         this.$nextTick(() => this.renderLineChart());
@@ -5,7 +5,9 @@ export const AdminReservations = {
   data() {
     return {
       reservations: [],
+      nextCursor: null,
       busy: false,
+      loadingMore: false,
     };
   },
   mounted() {
@@ -17,9 +19,20 @@ export const AdminReservations = {
       const res = await api.admin.listReservations();
       if (res.ok) {
         this.reservations = res.data.reservations || [];
+        this.nextCursor = res.data.next_cursor || null;
       }
       this.busy = false;
     },
+    async loadMore() {
+      if (!this.nextCursor) return;
+      this.loadingMore = true;
+      const res = await api.admin.listReservations({ cursor: this.nextCursor });
+      if (res.ok) {
+        this.reservations = this.reservations.concat(res.data.reservations || []);
+        this.nextCursor = res.data.next_cursor || null;
+      }
+      this.loadingMore = false;
+    },
   },
   template: `
     <div>
@@ -36,7 +49,7 @@ export const AdminReservations = {
         </div>
         <div v-else>
           <div class="mb-3">
-            <h5>Total Reservations: {{ reservations.length }}</h5>
+            <h5>Showing {{ reservations.length }} reservations</h5>
           </div>
           <div v-if="reservations.length === 0" class="alert alert-info">
             <i class="bi bi-info-circle"></i> No reservations found.
@@ -77,6 +90,11 @@ export const AdminReservations = {
                 </tr>
               </tbody>
             </table>
+            <div v-if="nextCursor" class="text-center">
+              <button class="btn btn-outline-secondary btn-sm" @click="loadMore" :disabled="loadingMore">
+                <i class="bi bi-chevron-down"></i> Load more
+              </button>
+            </div>
           </div>
         </div>
       </div>
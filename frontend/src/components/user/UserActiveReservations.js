@@ -21,7 +21,7 @@ export const UserActiveReservations = {
   methods: {
     async loadReservations() {
       this.loading = true;
-      const response = await api.user.listReservations();
+      const response = await api.user.listReservations({ status: "active", limit: 500 });
       if (response.ok) {
         this.reservations = response.data.reservations || [];
       }
@@ -11,12 +11,42 @@ export const UserBooking = {
       selectedLotId: "",
       quantity: 1,
       vehicleNumber: "",
+      stream: null,
     };
   },
   mounted() {
     this.loadLots();
+    this.openStream();
+  },
+  beforeUnmount() {
+    if (this.stream) {
+      this.stream.close();
+      this.stream = null;
+    }
   },
   methods: {
+    openStream() {
+      if (typeof EventSource === "undefined") return;
+      this.stream = api.user.lotStream();
+      this.stream.addEventListener("lot", (event) => this.applyLotState(JSON.parse(event.data)));
+      this.stream.addEventListener("snapshot", (event) => {
+        JSON.parse(event.data).lots.forEach((state) => this.applyLotState(state));
+      });
+    },
+    applyLotState(state) {
+      const index = this.lots.findIndex((lot) => lot.id === state.lot_id);
+      if (state.deleted) {
+        if (index !== -1) this.lots.splice(index, 1);
+        return;
+      }
+      if (index === -1) {
+        // A lot we do not list (new, or it was full) has free spots again.
+        if (state.available_spots > 0 && !this.loading) this.loadLots();
+        return;
+      }
+      this.lots[index].available_spots = state.available_spots;
+      this.lots[index].total_spots = state.total_spots;
+    },
     async loadLots() {
       this.loading = true;
       const response = await api.user.listLots();
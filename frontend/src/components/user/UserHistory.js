@@ -6,7 +6,9 @@ export const UserHistory = {
   data() {
     return {
       reservations: [],
+      nextCursor: null,
       loading: false,
+      loadingMore: false,
       releaseBusy: new Set(),
     };
   },
@@ -32,9 +34,20 @@ export const UserHistory = {
       const response = await api.user.listReservations();
       if (response.ok) {
         this.reservations = response.data.reservations || [];
+        this.nextCursor = response.data.next_cursor || null;
       }
       this.loading = false;
     },
+    async loadMore() {
+      if (!this.nextCursor) return;
+      this.loadingMore = true;
+      const response = await api.user.listReservations({ cursor: this.nextCursor });
+      if (response.ok) {
+        this.reservations = this.reservations.concat(response.data.reservations || []);
+        this.nextCursor = response.data.next_cursor || null;
+      }
+      this.loadingMore = false;
+    },
     async releaseReservation(reservationId) {
       this.releaseBusy.add(reservationId);
       const response = await api.user.releaseReservation(reservationId);
@@ -148,6 +161,12 @@ export const UserHistory = {
                 </table>
               </div>
             </div>
+
+            <div v-if="nextCursor" class="text-center">
+              <button class="btn btn-outline-secondary btn-sm" @click="loadMore" :disabled="loadingMore">
+                <i class="bi bi-chevron-down"></i> Load more
+              </button>
+            </div>
           </div>
         </div>
       </div>
@@ -46,9 +46,22 @@ export const UserStats = {
   methods: {
     async loadReservations() {
       this.loading = true;
-      const response = await api.user.listReservations();
-      if (response.ok) {
-        this.reservations = response.data.reservations || [];
+      // Totals cover the whole history, so walk every page (archived rows
+      // included) rather than summing only the first one.
+      const reservations = [];
+      let cursor = null;
+      let ok = true;
+      do {
+        const response = await api.user.listReservations({ limit: 500, include_archive: 1, cursor });
+        if (!response.ok) {
+          ok = false;
+          break;
+        }
+        reservations.push(...(response.data.reservations || []));
+        cursor = response.data.next_cursor || null;
+      } while (cursor);
+      if (ok) {
+        this.reservations = reservations;
         this.$nextTick(() => {
           this.renderDoughnutChart();
           this.renderLineChart();